@@ -0,0 +1,136 @@
+"""音声のデコード（16kHz モノラルの16bit PCMとして読み込む）
+
+通常はffmpegでデコードするが、既に16kHz モノラル 16bitのWAVファイルは
+ffmpegを起動せずに直接読み込む。
+"""
+import subprocess
+import wave
+
+# Whisperが前提とするサンプリングレート（16kHz モノラル）
+SAMPLE_RATE = 16000
+
+# ffmpegの標準出力から一度に読み込むバイト数
+READ_SIZE = 1 << 16
+
+
+class FfmpegPcmStream:
+    """ffmpegのサブプロセスでデコードしたPCMを読み出すストリーム"""
+
+    def __init__(self, file_path, start_seconds=0, sample_rate=SAMPLE_RATE):
+        # -ss を入力の前に置き、先頭からデコードせずにシークする
+        seek = ["-ss", str(start_seconds)] if start_seconds else []
+        cmd = [
+            "ffmpeg", "-nostdin", "-threads", "0", *seek, "-i", file_path,
+            "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate),
+            "-loglevel", "error", "-",
+        ]
+        self._process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def read(self, size):
+        return self._process.stdout.read(size)
+
+    def close(self, check=True):
+        """ffmpegを終了させ、checkがTrueでデコードに失敗していた場合は例外を送出する"""
+        process = self._process
+        if process is None:
+            return
+        self._process = None
+        process.stdout.close()
+        stderr = process.stderr.read().decode(errors="replace")
+        process.stderr.close()
+        if process.wait() != 0 and check:
+            raise RuntimeError(f"音声の読み込みに失敗しました: {stderr.strip()}")
+
+
+class WavPcmStream:
+    """16kHz モノラル 16bitのWAVファイルを直接読み出すストリーム"""
+
+    def __init__(self, file_path, start_seconds=0, sample_rate=SAMPLE_RATE):
+        self._wav = wave.open(file_path, 'rb')
+        if start_seconds:
+            self._wav.setpos(min(int(start_seconds * sample_rate), self._wav.getnframes()))
+
+    def read(self, size):
+        return self._wav.readframes(size // 2)
+
+    def close(self, check=True):
+        if self._wav is not None:
+            self._wav.close()
+            self._wav = None
+
+
+def is_native_wav(file_path, sample_rate=SAMPLE_RATE):
+    """ffmpegによる変換が不要なWAVファイルかどうか"""
+    if not file_path.lower().endswith(".wav"):
+        return False
+    try:
+        with wave.open(file_path, 'rb') as wav:
+            return (wav.getnchannels() == 1 and wav.getsampwidth() == 2
+                    and wav.getframerate() == sample_rate and wav.getcomptype() == "NONE")
+    except (OSError, EOFError, wave.Error):
+        return False
+
+
+def open_pcm_stream(file_path, start_seconds=0, sample_rate=SAMPLE_RATE):
+    """16bit PCM（リトルエンディアン）を read(size) で読み出せるストリームを開く
+
+    使用後は必ず close() を呼ぶこと（デコードの失敗は close() で例外になる。
+    途中で読み込みをやめる場合は close(check=False) とする）。
+    """
+    if is_native_wav(file_path, sample_rate):
+        return WavPcmStream(file_path, start_seconds, sample_rate)
+    return FfmpegPcmStream(file_path, start_seconds, sample_rate)
+
+
+def pcm_to_float(buffer, count=None):
+    """16bit PCMのバイト列をfloat32の波形（-1.0〜1.0）に変換する"""
+    import numpy as np
+
+    if count is None:
+        count = len(buffer) // 2
+    # int16のビューはfloat32へ変換した時点で解放され、元のバッファの変更を妨げない
+    return np.frombuffer(buffer, np.int16, count=count).astype(np.float32) / 32768.0
+
+
+def _open_source(file_path, sample_rate, source, start_seconds=0):
+    if source is not None:
+        return source.open_stream(start_seconds)
+    return open_pcm_stream(file_path, start_seconds, sample_rate)
+
+
+def read_short_audio(file_path, max_seconds, sample_rate=SAMPLE_RATE, source=None):
+    """音声が max_seconds 以下の場合のみ全体をデコードして返す（長い場合はNone）
+
+    長い音声は max_seconds 分を読んだところでデコードを打ち切るため、
+    長さを調べるためにファイル全体をデコードすることはない。
+    source には先読み済みの音声（prefetch.DecodedAudio）を指定できる。
+    """
+    limit = int(max_seconds * sample_rate) * 2
+    stream = _open_source(file_path, sample_rate, source)
+    buffer = bytearray()
+    eof = False
+    try:
+        while len(buffer) <= limit:
+            data = stream.read(READ_SIZE)
+            if not data:
+                eof = True
+                break
+            buffer.extend(data)
+    finally:
+        stream.close(check=eof)
+    return pcm_to_float(buffer) if eof else None
+
+
+def load_audio(file_path, sample_rate=SAMPLE_RATE, source=None):
+    """ファイル全体をデコードしてfloat32の波形を返す"""
+    stream = _open_source(file_path, sample_rate, source)
+    buffer = bytearray()
+    try:
+        while True:
+            data = stream.read(READ_SIZE)
+            if not data:
+                break
+            buffer.extend(data)
+    finally:
+        stream.close()
+    return pcm_to_float(buffer)
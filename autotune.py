@@ -0,0 +1,334 @@
+"""ハードウェアと音声の長さに応じたモデル・並列数の自動選択
+
+空きメモリとコア数を調べ、この環境で実測した実時間比（処理時間 / 音声の長さ）から、
+選択されたファイル全体を目標時間内に処理できる最も大きいモデルと、
+torchのスレッド数・ワーカー数を選ぶ。実測値はモデル・バックエンド・スレッド数ごとに
+保存し、次回からは計測を省略する。
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import wave
+
+from audio import SAMPLE_RATE
+from backends import DEFAULT_BACKEND
+from engine import format_duration
+from model_cache import ESTIMATED_MODEL_BYTES, estimate_load_bytes, resolve_loader
+
+AUTO_MODEL = "auto"
+MODEL_NAMES = ("tiny", "base", "small", "medium", "large")
+
+# 計測に使う音声の長さ（Whisperの入力窓1つ分）
+CALIBRATION_SECONDS = 30
+# 計測値がない場合に使う、tinyを1とした推論時間の目安（Whisperの公式の速度比から）
+RELATIVE_COST = {"tiny": 1.0, "base": 1.4, "small": 2.5, "medium": 5.0, "large": 10.0}
+# スレッド数を減らした場合の速度低下の度合い（1で完全に比例、0で影響なし）
+THREAD_SCALING = 0.7
+# ワーカーごとにモデル以外で必要なメモリ（Python・torch本体、推論中の作業領域）
+WORKER_OVERHEAD_BYTES = 600 * 1024 ** 2
+# 推論中はモデルの重みに加えてこの割合の作業領域を使う
+ACTIVATION_FACTOR = 0.5
+# 空きメモリのうち、文字起こしに使ってよい割合
+MEMORY_HEADROOM = 0.85
+# 長さを調べられない音声のビットレートの目安（バイト/秒、128kbps）
+FALLBACK_BYTES_PER_SECOND = 16000
+
+
+def memory_info():
+    """(物理メモリの合計, 空きメモリ) をバイトで返す（調べられない値はNone）"""
+    try:
+        import psutil
+        memory = psutil.virtual_memory()
+        return memory.total, memory.available
+    except ImportError:
+        pass
+    if sys.platform.startswith("linux"):
+        try:
+            values = {}
+            with open("/proc/meminfo", 'r') as f:
+                for line in f:
+                    name, _, rest = line.partition(":")
+                    values[name] = int(rest.split()[0]) * 1024
+            return values.get("MemTotal"), values.get("MemAvailable", values.get("MemFree"))
+        except (OSError, ValueError, IndexError):
+            return None, None
+    if sys.platform == "win32":
+        import ctypes
+
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                        ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                        ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                        ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                        ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+
+        status = MEMORYSTATUSEX()
+        status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullTotalPhys, status.ullAvailPhys
+        return None, None
+    try:
+        # macOSなど: 空きメモリは調べられないため合計のみ
+        total = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+        return total, None
+    except (ValueError, OSError, AttributeError):
+        return None, None
+
+
+def probe_hardware():
+    """コア数とメモリ量を調べる"""
+    total, available = memory_info()
+    return {
+        "cpu_count": os.cpu_count() or 1,
+        "total_memory_bytes": total,
+        # 空きメモリが分からない場合は合計の半分を目安とする
+        "available_memory_bytes": available if available is not None else (total // 2 if total else None),
+    }
+
+
+def estimate_worker_bytes(model_name, backend=DEFAULT_BACKEND):
+    """1ワーカー（1プロセス）がモデルを読み込んで推論する際に必要なメモリの目安"""
+    model_bytes = estimate_load_bytes(model_name, backend, default=ESTIMATED_MODEL_BYTES["large"])
+    return int(model_bytes * (1 + ACTIVATION_FACTOR)) + WORKER_OVERHEAD_BYTES
+
+
+def memory_warning(model_name, backend=DEFAULT_BACKEND, workers=1, hardware=None):
+    """メモリ不足になりそうな場合に警告文を返す（問題ない・判断できない場合はNone）"""
+    if model_name == AUTO_MODEL:
+        return None
+    hardware = hardware or probe_hardware()
+    available = hardware["available_memory_bytes"]
+    if not available:
+        return None
+    required = estimate_worker_bytes(model_name, backend) * max(1, workers)
+    if required <= available * MEMORY_HEADROOM:
+        return None
+    gib = 1024 ** 3
+    return (f"モデル {model_name}（{backend}、並列数 {workers}）には約{required / gib:.1f}GBのメモリが必要ですが、"
+            f"空きメモリは約{available / gib:.1f}GBです。処理が強制終了される可能性があります"
+            f"（より小さいモデル、whisper-int8、または並列数を減らすことをおすすめします）。")
+
+
+def estimate_audio_seconds(file_path):
+    """音声の長さ（秒）を調べる（ffprobeがない場合はファイルサイズから推定する）"""
+    if file_path.lower().endswith(".wav"):
+        try:
+            with wave.open(file_path, 'rb') as wav:
+                return wav.getnframes() / wav.getframerate()
+        except (OSError, EOFError, wave.Error):
+            pass
+    try:
+        output = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", file_path],
+            capture_output=True, text=True, timeout=30).stdout
+        return float(output.strip())
+    except (OSError, ValueError, subprocess.SubprocessError):
+        pass
+    try:
+        return os.path.getsize(file_path) / FALLBACK_BYTES_PER_SECOND
+    except OSError:
+        return 0.0
+
+
+class CalibrationStore:
+    """モデル・バックエンド・スレッド数ごとの実時間比の実測値
+
+    CPUやコア数が変わった場合は以前の実測値を使わない。
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            from settings import get_app_dir
+            path = get_app_dir("calibration.json")
+        self.path = path
+        self.machine = {"machine": platform.machine(), "processor": platform.processor(),
+                        "cpu_count": os.cpu_count() or 1}
+        self.results = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("machine") == self.machine:
+                self.results = data.get("results", {})
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def _key(model_name, backend, threads):
+        return f"{backend}:{model_name}:{threads}"
+
+    def get(self, model_name, backend, threads):
+        return self.results.get(self._key(model_name, backend, threads))
+
+    def clear(self):
+        """実測値を破棄する（次回の自動選択で計測し直す）"""
+        self.results = {}
+
+    def put(self, model_name, backend, threads, rtf):
+        self.results[self._key(model_name, backend, threads)] = rtf
+        try:
+            temp_path = self.path + ".tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({"machine": self.machine, "results": self.results}, f, indent=2)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"計測結果の保存に失敗しました: {str(e)}")
+
+    def estimate(self, model_name, backend, threads):
+        """実測値、なければ他のモデル・スレッド数の実測値から推定した実時間比（なければNone）"""
+        rtf = self.get(model_name, backend, threads)
+        if rtf is not None:
+            return rtf
+        estimates = []
+        for key, measured in self.results.items():
+            other_backend, other_model, other_threads = key.split(":")
+            if other_backend != backend or other_model not in RELATIVE_COST:
+                continue
+            scale = RELATIVE_COST[model_name] / RELATIVE_COST[other_model]
+            scale *= (int(other_threads) / threads) ** THREAD_SCALING
+            estimates.append(measured * scale)
+        # 大きすぎるモデルを選ばないよう、最も遅い推定値を使う
+        return max(estimates) if estimates else None
+
+
+def calibration_audio(file_paths, seconds=CALIBRATION_SECONDS):
+    """計測に使う音声（選択されたファイルの先頭、なければ合成音声）"""
+    from chunking import stream_audio_windows
+
+    for file_path in file_paths:
+        windows = stream_audio_windows(file_path, seconds, 0)
+        try:
+            _, audio, _ = next(windows)
+            if len(audio) >= SAMPLE_RATE:
+                return audio
+        except Exception:
+            continue
+        finally:
+            windows.close()
+    import numpy as np
+
+    # 発話に見立てた断続的なトーン（benchmark.write_synthetic_wav と同じ波形）
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    voiced = (t % 3.0) < 2.0
+    audio = voiced * 0.3 * np.sin(2 * np.pi * (180 + 40 * np.sin(2 * np.pi * 0.5 * t)) * t)
+    return audio.astype(np.float32)
+
+
+def calibrate(model_name, backend, threads, audio, language=None, model_loader=None):
+    """モデルを読み込み、audio の文字起こしにかかった時間から実時間比を計測する"""
+    from worker_pool import set_torch_threads
+
+    set_torch_threads(threads)
+    model = resolve_loader(model_loader)(model_name, None, backend)
+    try:
+        start = time.perf_counter()
+        model.transcribe(audio, language=language)
+        return (time.perf_counter() - start) / (len(audio) / SAMPLE_RATE)
+    finally:
+        del model
+        import gc
+        gc.collect()
+
+
+def _worker_options(cpu_count, max_workers):
+    """(ワーカー数, ワーカーあたりのスレッド数) の候補（コアを均等に割り当てる）"""
+    return [(workers, max(1, cpu_count // workers)) for workers in range(1, max(1, max_workers) + 1)]
+
+
+def choose_settings(file_paths, target_seconds=None, target_ratio=1.0, backend=DEFAULT_BACKEND,
+                    language=None, model_loader=None, store=None, hardware=None,
+                    calibrate_missing=True, on_status=None):
+    """目標時間内に処理できる最も大きいモデルと並列数を選び、計画の辞書を返す
+
+    target_seconds を省略した場合は、音声の合計の長さ × target_ratio を目標とする。
+    計測値のないモデルは calibrate_missing が True の場合に計測する（小さいモデルから順に、
+    目標を満たせなくなった時点で打ち切る）。
+    """
+    hardware = hardware or probe_hardware()
+    store = store or CalibrationStore()
+    cpu_count = hardware["cpu_count"]
+    available = hardware["available_memory_bytes"]
+    durations = [estimate_audio_seconds(path) for path in file_paths]
+    # ファイルが決まっていない場合（フォルダの監視など）は音声1秒あたりで比べる
+    total_seconds = sum(durations) if file_paths else 1.0
+    if target_seconds is None:
+        target_seconds = total_seconds * target_ratio
+    # ファイル単位で並列処理するため、ワーカー数はファイル数を超えない
+    max_workers = min(cpu_count, len(file_paths)) if file_paths else 1
+
+    def status(message):
+        if on_status:
+            on_status(message)
+
+    audio = None
+    candidates = []
+    for model_name in MODEL_NAMES:
+        worker_bytes = estimate_worker_bytes(model_name, backend)
+        if available and worker_bytes > available * MEMORY_HEADROOM:
+            # これより大きいモデルも読み込めない
+            break
+        rtf = store.get(model_name, backend, cpu_count)
+        if rtf is None and calibrate_missing:
+            if audio is None:
+                audio = calibration_audio(file_paths)
+            status(f"モデル {model_name} の処理速度を計測中...")
+            try:
+                rtf = calibrate(model_name, backend, cpu_count, audio, language, model_loader)
+                store.put(model_name, backend, cpu_count, rtf)
+            except Exception as e:
+                # 読み込めない原因（未インストールなど）は他のモデルでも同じため、以降は推定値を使う
+                print(f"モデル {model_name} の計測に失敗しました: {str(e)}")
+                calibrate_missing = False
+        if rtf is None:
+            rtf = store.estimate(model_name, backend, cpu_count)
+        if rtf is None:
+            continue
+
+        best = None
+        for workers, threads in _worker_options(cpu_count, max_workers):
+            if available and worker_bytes * workers > available * MEMORY_HEADROOM:
+                break
+            # ワーカーあたりのスレッド数が減るほど1ファイルの処理は遅くなる
+            worker_rtf = rtf * (cpu_count / threads) ** THREAD_SCALING
+            estimated = total_seconds * worker_rtf / workers
+            if file_paths:
+                # 並列処理では最も長いファイルより早くは終わらない
+                estimated = max(estimated, max(durations) * worker_rtf)
+            if best is None or estimated < best["estimated_seconds"]:
+                best = {"model": model_name, "backend": backend, "workers": workers,
+                        "torch_threads": threads, "rtf": rtf, "estimated_seconds": estimated,
+                        "memory_bytes": worker_bytes * workers}
+        if best is None:
+            continue
+        candidates.append(best)
+        if best["estimated_seconds"] > target_seconds:
+            # これより大きいモデルは更に遅い
+            break
+
+    if not candidates:
+        # 計測も推定もできない場合は最小のモデルを使う
+        plan = {"model": MODEL_NAMES[0], "backend": backend, "workers": 1,
+                "torch_threads": cpu_count, "rtf": None, "estimated_seconds": None,
+                "memory_bytes": estimate_worker_bytes(MODEL_NAMES[0], backend)}
+    else:
+        meeting = [c for c in candidates if c["estimated_seconds"] <= target_seconds]
+        # 目標を満たすものがなければ最も速いもの
+        plan = meeting[-1] if meeting else min(candidates, key=lambda c: c["estimated_seconds"])
+        plan["meets_target"] = bool(meeting)
+    plan.update(audio_seconds=total_seconds, target_seconds=target_seconds, hardware=hardware,
+                warning=memory_warning(plan["model"], backend, plan["workers"], hardware))
+    return plan
+
+
+def describe_plan(plan):
+    """計画の説明文"""
+    text = (f"自動選択: モデル {plan['model']}（{plan['backend']}）、並列数 {plan['workers']}、"
+            f"スレッド数 {plan['torch_threads']}")
+    if plan.get("estimated_seconds") is not None:
+        text += (f"、音声 {format_duration(plan['audio_seconds'])} の処理に"
+                 f"約{format_duration(plan['estimated_seconds'])}の見込み")
+        if not plan.get("meets_target", True):
+            text += f"（目標の{format_duration(plan['target_seconds'])}以内には終わらない見込みです）"
+    return text
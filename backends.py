@@ -0,0 +1,139 @@
+"""推論バックエンド（モデルの実装）の切り替え
+
+どのバックエンドのモデルも Whisper と同じ transcribe(audio, language=None, **options)
+を持ち、同じ形式の結果辞書（text, segments, language）を返す。
+
+- whisper: openai-whisper（PyTorch、CPUではfp32）
+- whisper-int8: openai-whisper の全結合層をint8に動的量子化したもの（CPUのみ）
+- faster-whisper: CTranslate2による実装（インストールされている場合のみ、CPUではint8）
+"""
+import importlib.util
+
+BACKEND_WHISPER = "whisper"
+BACKEND_WHISPER_INT8 = "whisper-int8"
+BACKEND_FASTER_WHISPER = "faster-whisper"
+
+BACKENDS = (BACKEND_WHISPER, BACKEND_WHISPER_INT8, BACKEND_FASTER_WHISPER)
+DEFAULT_BACKEND = BACKEND_WHISPER
+
+# faster-whisper のモデルの推論スレッド数（0の場合はCTranslate2の既定値）
+_cpu_threads = 0
+
+# 各バックエンドが必要とするパッケージ（import名）
+_REQUIRED_MODULES = {
+    BACKEND_WHISPER: "whisper",
+    BACKEND_WHISPER_INT8: "whisper",
+    BACKEND_FASTER_WHISPER: "faster_whisper",
+}
+
+
+def available_backends():
+    """インストールされているパッケージで使えるバックエンドを返す（パッケージはimportしない）"""
+    return [backend for backend in BACKENDS
+            if importlib.util.find_spec(_REQUIRED_MODULES[backend]) is not None]
+
+
+def set_cpu_threads(threads):
+    """以降に読み込む faster-whisper のモデルの推論スレッド数を設定する（0またはNoneの場合は既定値）
+
+    PyTorch を使うバックエンドのスレッド数は torch.set_num_threads で設定する。
+    """
+    global _cpu_threads
+    _cpu_threads = threads or 0
+
+
+def resolve_device(device=None, backend=DEFAULT_BACKEND):
+    """デバイス指定を解決する（未指定時はWhisperと同じくCUDAがあればCUDA）"""
+    if device:
+        return device
+    if backend == BACKEND_WHISPER_INT8:
+        # 動的量子化したモデルはCPUでのみ実行できる
+        return "cpu"
+    if backend == BACKEND_FASTER_WHISPER:
+        import ctranslate2
+        return "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def load_model(model_name, device=None, backend=DEFAULT_BACKEND):
+    """指定したバックエンドでモデルを読み込む（初回は自動ダウンロード）"""
+    if backend not in BACKENDS:
+        raise ValueError(f"不明なバックエンドです: {backend}")
+    device = resolve_device(device, backend)
+    if backend == BACKEND_FASTER_WHISPER:
+        return FasterWhisperModel(model_name, device, cpu_threads=_cpu_threads)
+    import whisper
+    model = whisper.load_model(model_name, device=device)
+    if backend == BACKEND_WHISPER_INT8:
+        model = quantize_whisper_model(model)
+    return model
+
+
+def quantize_whisper_model(model):
+    """Whisperモデルの全結合層の重みをint8に動的量子化する
+
+    畳み込み層や埋め込みはfp32のまま残るため、結果の形式は変わらない。
+    """
+    import torch
+    import whisper.model
+
+    if "fbgemm" not in torch.backends.quantized.supported_engines:
+        # ARMなどではqnnpackを使う
+        torch.backends.quantized.engine = "qnnpack"
+
+    linear_bytes = 0
+    for module in model.modules():
+        if isinstance(module, torch.nn.Linear):
+            linear_bytes += sum(p.numel() * p.element_size() for p in module.parameters(recurse=False))
+            # Whisper独自のLinearは入力の型に重みを合わせるだけのため、標準のLinearとして量子化する
+            if type(module) is whisper.model.Linear:
+                module.__class__ = torch.nn.Linear
+    other_bytes = sum(p.numel() * p.element_size() for p in model.parameters()) - linear_bytes
+
+    # fp32のモデルを複製しないよう、その場で置き換える
+    torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    # 量子化した重みは parameters() に含まれないため、メモリ使用量の推定値を持たせておく
+    model.estimated_bytes = other_bytes + linear_bytes // 4
+    return model
+
+
+class FasterWhisperModel:
+    """faster-whisper のモデルを Whisper と同じ transcribe() の形式で使うためのラッパー"""
+
+    def __init__(self, model_name, device="cpu", cpu_threads=0, num_workers=1):
+        from faster_whisper import WhisperModel
+
+        compute_type = "int8" if device == "cpu" else "float16"
+        # 並列処理ではワーカーごとにモデルを読み込むため、1つのモデルを同時に使うのは1スレッドのみ
+        self._model = WhisperModel(model_name, device=device, compute_type=compute_type,
+                                   cpu_threads=cpu_threads, num_workers=num_workers)
+
+    def transcribe(self, audio, language=None, word_timestamps=False, **options):
+        # Whisperのみのオプション（fp16など）は渡さない
+        options.pop("fp16", None)
+        options.pop("verbose", None)
+        segments, info = self._model.transcribe(audio, language=language,
+                                                word_timestamps=word_timestamps, **options)
+        results = []
+        for segment in segments:
+            item = {
+                "id": len(results),
+                "start": segment.start,
+                "end": segment.end,
+                "text": segment.text,
+                "tokens": list(segment.tokens),
+                "temperature": getattr(segment, "temperature", None),
+                "avg_logprob": segment.avg_logprob,
+                "compression_ratio": segment.compression_ratio,
+                "no_speech_prob": segment.no_speech_prob,
+            }
+            if segment.words is not None:
+                item["words"] = [{"word": word.word, "start": word.start, "end": word.end,
+                                  "probability": word.probability} for word in segment.words]
+            results.append(item)
+        return {
+            "text": "".join(item["text"] for item in results),
+            "segments": results,
+            "language": info.language,
+        }
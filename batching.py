@@ -0,0 +1,129 @@
+"""短い音声のバッチ処理
+
+30秒以下の音声は1ファイルごとに transcribe() を呼ぶと、毎回30秒分に
+パディングしたメルスペクトログラムでエンコーダを実行することになる。
+複数の音声のメルスペクトログラムをまとめ、エンコーダとデコーダを
+1回の推論でバッチ実行してから、結果を音声ごとに分けて返す。
+"""
+from audio import SAMPLE_RATE
+from vad import SpeechMap, detect_speech
+
+# 1回の推論で処理できる音声の長さ（Whisperの入力窓）
+BATCH_MAX_SECONDS = 30
+DEFAULT_BATCH_SIZE = 8
+
+# Whisperの transcribe() と同じ品質の判定基準
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+# タイムスタンプトークン1つあたりの秒数
+TIME_PRECISION = 0.02
+
+
+def supports_batching(model):
+    """バッチ推論に対応したモデル（openai-whisperのモデル）かどうか"""
+    return hasattr(model, "dims") and hasattr(model, "decoder")
+
+
+def _get_tokenizer(model):
+    from whisper.tokenizer import get_tokenizer
+
+    try:
+        return get_tokenizer(model.is_multilingual, num_languages=model.num_languages,
+                             task="transcribe")
+    except (TypeError, AttributeError):
+        # 古いバージョンのWhisperには num_languages がない
+        return get_tokenizer(model.is_multilingual, task="transcribe")
+
+
+def _split_segments(decoded, tokenizer, duration):
+    """タイムスタンプトークンでセグメントに分割する"""
+    timestamp_begin = tokenizer.timestamp_begin
+    segments = []
+    start = None
+    text_tokens = []
+
+    def add_segment(end):
+        text = tokenizer.decode(text_tokens)
+        if text.strip():
+            segments.append({
+                "id": len(segments), "seek": 0,
+                "start": start or 0.0, "end": min(max(end, start or 0.0), duration),
+                "text": text, "tokens": list(text_tokens),
+                "temperature": decoded.temperature, "avg_logprob": decoded.avg_logprob,
+                "compression_ratio": decoded.compression_ratio,
+                "no_speech_prob": decoded.no_speech_prob,
+            })
+
+    for token in decoded.tokens:
+        if token >= timestamp_begin:
+            t = (token - timestamp_begin) * TIME_PRECISION
+            if text_tokens:
+                add_segment(t)
+                text_tokens = []
+                start = None
+            elif start is None:
+                start = t
+        else:
+            text_tokens.append(token)
+    if text_tokens:
+        # 終了のタイムスタンプがない場合は音声の末尾までとする
+        add_segment(duration)
+    return segments
+
+
+def transcribe_batch(model, audios, language=None, vad=False, **decode_options):
+    """30秒以下の波形のリストをまとめて文字起こしし、音声ごとの結果辞書のリストを返す
+
+    品質の判定基準を満たさなかった音声は、温度を変えて再試行できるよう
+    個別に model.transcribe() で処理し直す。
+    """
+    import torch
+    import whisper
+
+    results = [None] * len(audios)
+    speech_maps = [None] * len(audios)
+    inputs = []
+    for i, audio in enumerate(audios):
+        if vad:
+            speech = speech_maps[i] = SpeechMap(audio, detect_speech(audio))
+            if speech.speech_seconds == 0:
+                results[i] = speech.empty_result(language)
+                continue
+            audio = speech.audio
+        inputs.append((i, audio))
+    if not inputs:
+        return results
+
+    n_mels = getattr(model.dims, "n_mels", 80)
+    mels = []
+    for _, audio in inputs:
+        padded = whisper.pad_or_trim(torch.from_numpy(audio))
+        if n_mels == 80:
+            mels.append(whisper.log_mel_spectrogram(padded))
+        else:
+            mels.append(whisper.log_mel_spectrogram(padded, n_mels))
+    mel_batch = torch.stack(mels).to(model.device)
+
+    options = whisper.DecodingOptions(language=language, fp16=model.device.type != "cpu",
+                                      without_timestamps=False)
+    decoded_batch = whisper.decode(model, mel_batch, options)
+    tokenizer = _get_tokenizer(model)
+
+    for (i, audio), decoded in zip(inputs, decoded_batch):
+        duration = len(audio) / SAMPLE_RATE
+        if decoded.no_speech_prob > NO_SPEECH_THRESHOLD and decoded.avg_logprob < LOGPROB_THRESHOLD:
+            # 無音と判定された音声（Whisperの transcribe() と同じく結果を空にする）
+            result = {"text": "", "segments": [], "language": decoded.language}
+        elif (decoded.compression_ratio > COMPRESSION_RATIO_THRESHOLD
+              or decoded.avg_logprob < LOGPROB_THRESHOLD):
+            result = model.transcribe(audio, language=language, **decode_options)
+        else:
+            segments = _split_segments(decoded, tokenizer, duration)
+            result = {"text": "".join(segment["text"] for segment in segments),
+                      "segments": segments, "language": decoded.language}
+        if speech_maps[i] is not None:
+            results[i] = speech_maps[i].to_original_result(result)
+        else:
+            results[i] = dict(result, audio_seconds=duration, skipped_seconds=0.0)
+    return results
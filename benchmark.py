@@ -0,0 +1,275 @@
+"""文字起こし処理のベンチマーク
+
+合成した音声ファイルを一時フォルダに作成し、TranscriptionEngine で最初から
+最後まで（デコード・モデル読み込み・推論・保存）処理して、所要時間、
+実時間比（RTF）、最大メモリ使用量、処理段階ごとの内訳をJSONで出力する。
+デフォルトではWhisperの代わりにスタブモデルを使うため、ネットワークやGPUのない
+環境でも実行できる。
+--startup を指定すると、新しいプロセスでの起動時間（ウィンドウが表示されるまでなど）を計測する。
+
+使い方:
+    python benchmark.py --files 4 --seconds 120 -j 2 -o result.json
+    python benchmark.py --model-loader backends:load_model --model small --backend whisper-int8
+    python benchmark.py --startup --repeat 10
+    python benchmark.py --startup --executable dist/SimpleTranscriber.exe
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+from audio import SAMPLE_RATE
+from backends import BACKENDS, DEFAULT_BACKEND
+from batching import DEFAULT_BATCH_SIZE
+from chunking import DEFAULT_CHUNK_SECONDS, DEFAULT_OVERLAP_SECONDS
+from engine import TranscriptionEngine
+from instrumentation import peak_rss_bytes
+from prefetch import DEFAULT_PREFETCH
+
+STUB_LOADER = "benchmark:load_stub_model"
+# スタブモデルの推論時間（音声1秒あたりの秒数）。ワーカープロセスにも環境変数で渡す
+STUB_RTF_ENV = "SIMPLE_TRANSCRIBER_STUB_RTF"
+STUB_SEGMENT_SECONDS = 5.0
+
+# 起動時間の計測に使う環境変数（main.py がウィンドウの表示直後に終了する）
+STARTUP_PROBE_ENV = "SIMPLE_TRANSCRIBER_STARTUP_PROBE"
+STARTUP_TIMEOUT_SECONDS = 120
+# 合成音声を一度に生成する長さ（秒）。長い音声でも計測するプロセスのメモリを増やさない
+SYNTHETIC_BLOCK_SECONDS = 30
+
+
+class StubModel:
+    """Whisperモデルの代わりに、音声の長さに比例した時間だけ待って固定の結果を返す"""
+
+    def __init__(self, rtf=0.0):
+        self.rtf = rtf
+
+    def transcribe(self, audio, language=None, **decode_options):
+        seconds = len(audio) / SAMPLE_RATE
+        if self.rtf:
+            time.sleep(seconds * self.rtf)
+        segments = []
+        start = 0.0
+        while start < seconds:
+            end = min(start + STUB_SEGMENT_SECONDS, seconds)
+            segments.append({"id": len(segments), "start": start, "end": end,
+                             "text": f"区間{len(segments)}。"})
+            start = end
+        return {"text": "".join(s["text"] for s in segments), "segments": segments,
+                "language": language or "ja"}
+
+
+def load_stub_model(model_name, device=None, backend=None):
+    """engine/worker_pool の model_loader として使うスタブモデルの読み込み関数"""
+    return StubModel(float(os.environ.get(STUB_RTF_ENV, "0") or 0))
+
+
+def write_synthetic_wav(path, seconds, seed=0):
+    """発話に見立てた断続的なトーンと弱い雑音からなる16kHz モノラル 16bitのWAVを作成する
+
+    ベンチマークの最大メモリ使用量に影響しないよう、SYNTHETIC_BLOCK_SECONDS ずつ生成して書き込む。
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    n = int(seconds * SAMPLE_RATE)
+    block = SYNTHETIC_BLOCK_SECONDS * SAMPLE_RATE
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        for offset in range(0, n, block):
+            t = np.arange(offset, min(offset + block, n)) / SAMPLE_RATE
+            audio = rng.normal(0, 0.003, len(t))
+            # 2秒の「発話」と1秒の無音を繰り返す
+            voiced = (t % 3.0) < 2.0
+            audio += voiced * 0.3 * np.sin(2 * np.pi * (180 + 40 * np.sin(2 * np.pi * 0.5 * t)) * t)
+            wav.writeframes((np.clip(audio, -1, 1) * 32767).astype("<i2").tobytes())
+
+
+def run_benchmark(files=2, seconds=60.0, model_name="tiny", model_loader=STUB_LOADER,
+                  stub_rtf=0.0, workers=1, torch_threads=None,
+                  chunk_seconds=DEFAULT_CHUNK_SECONDS, overlap_seconds=DEFAULT_OVERLAP_SECONDS,
+                  vad=False, backend=DEFAULT_BACKEND, batch_size=DEFAULT_BATCH_SIZE,
+                  prefetch=DEFAULT_PREFETCH):
+    """合成音声を作成して処理し、計測結果の辞書を返す"""
+    os.environ[STUB_RTF_ENV] = str(stub_rtf)
+    with tempfile.TemporaryDirectory(prefix="transcriber_bench_") as work_dir:
+        input_dir = os.path.join(work_dir, "input")
+        os.makedirs(input_dir)
+        file_paths = []
+        for i in range(files):
+            path = os.path.join(input_dir, f"bench_{i:03d}.wav")
+            write_synthetic_wav(path, seconds, seed=i)
+            file_paths.append(path)
+
+        errors = []
+        engine = TranscriptionEngine(
+            model_name=model_name, language="ja", output_dir=os.path.join(work_dir, "output"),
+            workers=workers, torch_threads=torch_threads, chunk_seconds=chunk_seconds,
+            overlap_seconds=overlap_seconds, vad=vad, model_loader=model_loader,
+            backend=backend, batch_size=batch_size, prefetch=prefetch, on_error=errors.append)
+        start = time.perf_counter()
+        results = engine.run(file_paths)
+        wall_seconds = time.perf_counter() - start
+
+    errors.extend(f"{r['file']}: {r['error']}" for r in results if r["error"])
+    audio_seconds = files * seconds
+    return {
+        "config": {
+            "files": files, "seconds": seconds, "model": model_name, "backend": backend,
+            "model_loader": model_loader, "stub_rtf": stub_rtf, "workers": workers,
+            "torch_threads": torch_threads, "chunk_seconds": chunk_seconds,
+            "overlap_seconds": overlap_seconds, "vad": vad, "batch_size": batch_size,
+            "prefetch": prefetch,
+        },
+        "wall_seconds": wall_seconds,
+        "audio_seconds": audio_seconds,
+        "rtf": wall_seconds / audio_seconds if audio_seconds else None,
+        "peak_rss_bytes": peak_rss_bytes(),
+        "peak_rss_children_bytes": peak_rss_bytes(include_children=True),
+        # 並列処理の場合は全ワーカーの合計時間
+        "stages": engine.timer.as_dict(),
+        "errors": errors,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def _startup_probes(executable=None):
+    """(名前, コマンド) のリスト。それぞれ新しいプロセスで実行して所要時間を計測する"""
+    if executable:
+        return [("window", [executable])]
+    python = sys.executable
+    return [
+        # Pythonの起動そのもの（比較の基準）
+        ("interpreter", [python, "-c", "pass"]),
+        # GUIが起動時に読み込むモジュール
+        ("gui_modules", [python, "-c", "import main"]),
+        # ウィンドウが表示されるまで
+        ("window", [python, "main.py"]),
+        # バックグラウンドで読み込むwhisper/torch（ウィンドウの表示は待たない）
+        ("whisper_import", [python, "-c", "import whisper"]),
+    ]
+
+
+def run_startup_benchmark(repeat=5, executable=None):
+    """起動時間を計測し、計測結果の辞書を返す"""
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, **{STARTUP_PROBE_ENV: "1"})
+    probes = {}
+    errors = []
+    for name, cmd in _startup_probes(executable):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            try:
+                completed = subprocess.run(cmd, cwd=base_dir, env=env, capture_output=True,
+                                           timeout=STARTUP_TIMEOUT_SECONDS)
+            except (OSError, subprocess.TimeoutExpired) as e:
+                errors.append(f"{name}: {str(e)}")
+                break
+            elapsed = time.perf_counter() - start
+            if completed.returncode != 0:
+                stderr = completed.stderr.decode(errors="replace").strip().splitlines()
+                errors.append(f"{name}: {stderr[-1] if stderr else completed.returncode}")
+                break
+            samples.append(elapsed)
+        if samples:
+            probes[name] = {
+                "min": min(samples), "median": statistics.median(samples),
+                "mean": statistics.mean(samples), "max": max(samples), "samples": samples,
+            }
+    return {
+        "config": {"repeat": repeat, "executable": executable},
+        "startup_seconds": probes,
+        "errors": errors,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python benchmark.py",
+        description="合成音声で文字起こし処理全体を計測し、結果をJSONで出力します",
+    )
+    parser.add_argument("--files", type=int, default=2, help="作成する音声ファイル数（デフォルト: 2）")
+    parser.add_argument("--seconds", type=float, default=60.0,
+                        help="1ファイルあたりの音声の長さ（秒、デフォルト: 60）")
+    parser.add_argument("--model-loader", default=STUB_LOADER,
+                        help=f"モデルの読み込み関数（モジュール名:関数名、デフォルト: {STUB_LOADER}）")
+    parser.add_argument("-m", "--model", default="tiny", help="モデル名（デフォルト: tiny）")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, choices=BACKENDS,
+                        help=f"推論バックエンド（デフォルト: {DEFAULT_BACKEND}）")
+    parser.add_argument("--stub-rtf", type=float, default=0.0,
+                        help="スタブモデルの推論時間（音声1秒あたりの秒数、デフォルト: 0）")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="並列に処理するワーカープロセス数（デフォルト: 1）")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="ワーカーあたりのtorchスレッド数（0: 変更しない）")
+    parser.add_argument("--chunk-seconds", type=float, default=DEFAULT_CHUNK_SECONDS,
+                        help=f"窓の長さ（秒、0で分割しない、デフォルト: {DEFAULT_CHUNK_SECONDS}）")
+    parser.add_argument("--overlap-seconds", type=float, default=DEFAULT_OVERLAP_SECONDS,
+                        help=f"窓どうしの重なり（秒、デフォルト: {DEFAULT_OVERLAP_SECONDS}）")
+    parser.add_argument("--vad", action="store_true", help="無音区間の検出を有効にする")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"30秒以下の音声をまとめて推論する数（デフォルト: {DEFAULT_BATCH_SIZE}）")
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_PREFETCH,
+                        help=f"先読みしてデコードしておくファイル数（0で先読みしない、デフォルト: {DEFAULT_PREFETCH}）")
+    parser.add_argument("--startup", action="store_true",
+                        help="文字起こしの代わりに起動時間（ウィンドウが表示されるまでなど）を計測する")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="--startup で各項目を計測する回数（デフォルト: 5）")
+    parser.add_argument("--executable", default=None,
+                        help="--startup でPythonの代わりに計測するビルド済みの実行ファイル")
+    parser.add_argument("-o", "--output", default=None,
+                        help="結果を書き込むJSONファイル（デフォルト: 標準出力）")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.startup:
+        if args.repeat < 1:
+            print("エラー: --repeat には正の値を指定してください", file=sys.stderr)
+            return 2
+        report = run_startup_benchmark(args.repeat, args.executable)
+        return _write_report(report, args.output)
+    if args.files < 1 or args.seconds <= 0:
+        print("エラー: --files と --seconds には正の値を指定してください", file=sys.stderr)
+        return 2
+
+    report = run_benchmark(
+        files=args.files, seconds=args.seconds, model_name=args.model,
+        model_loader=args.model_loader, stub_rtf=args.stub_rtf, workers=args.workers,
+        torch_threads=args.threads or None, chunk_seconds=args.chunk_seconds,
+        overlap_seconds=args.overlap_seconds, vad=args.vad, backend=args.backend,
+        batch_size=args.batch_size, prefetch=args.prefetch)
+    return _write_report(report, args.output)
+
+
+def _write_report(report, output_path=None):
+    """計測結果をJSONで出力し、終了コードを返す"""
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
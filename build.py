@@ -7,6 +7,10 @@ import site
 def main():
     print("シンプル文字起こしツールのビルドを開始します...")
     
+    # --onedir: 起動のたびに一時フォルダへ展開する単一ファイル形式の代わりに、
+    # 展開済みのフォルダ形式で出力する（起動が速くなる）
+    onedir = "--onedir" in sys.argv[1:]
+    
     # 必要なパッケージの確認
     try:
         import pyinstaller
@@ -49,7 +53,7 @@ def main():
     # PyInstallerコマンドの構築
     pyinstaller_cmd = [
         "pyinstaller",
-        "--onefile",  # 単一の実行ファイルとして生成
+        "--onedir" if onedir else "--onefile",  # フォルダ形式、または単一の実行ファイルとして生成
         "--windowed",  # コンソールウィンドウを表示しない
         "--clean",     # 一時ファイルをクリーン
         "--name=SimpleTranscriber",  # 出力ファイル名
@@ -68,7 +72,11 @@ def main():
     subprocess.check_call(pyinstaller_cmd)
     
     print("ビルドが完了しました！")
-    print(f"実行ファイルは dist/SimpleTranscriber{'.exe' if sys.platform == 'win32' else ''} にあります")
+    exe_name = f"SimpleTranscriber{'.exe' if sys.platform == 'win32' else ''}"
+    if onedir:
+        print(f"実行ファイルは dist/SimpleTranscriber/{exe_name} にあります（フォルダごと配布してください）")
+    else:
+        print(f"実行ファイルは dist/{exe_name} にあります")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
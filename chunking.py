@@ -0,0 +1,183 @@
+"""長時間音声の分割処理
+
+入力をffmpegでストリーミングデコードし、重なりを持たせた固定長の窓ごとに
+文字起こしして、重なり部分のセグメントを重複・欠落なく結合する。
+メモリ上に保持する音声は常に1窓分（+読み込みバッファ）のみで、
+入力の長さに関係なくピークメモリは一定になる。
+"""
+from audio import READ_SIZE, SAMPLE_RATE, load_audio, open_pcm_stream, pcm_to_float
+from instrumentation import NULL_TIMER, STAGE_DECODE, STAGE_INFERENCE
+from vad import transcribe_with_vad
+
+DEFAULT_CHUNK_SECONDS = 300
+DEFAULT_OVERLAP_SECONDS = 5
+
+
+def stream_audio_windows(file_path, chunk_seconds=DEFAULT_CHUNK_SECONDS,
+                         overlap_seconds=DEFAULT_OVERLAP_SECONDS, sample_rate=SAMPLE_RATE,
+                         start_seconds=0, source=None):
+    """音声を重なり付きの固定長の窓に分割して返すジェネレータ
+
+    (開始秒, float32の波形, 最後の窓かどうか) を順に返す。
+    start_secondsを指定した場合はその位置から読み込む（開始秒は元の音声での位置）。
+    sourceを指定した場合はファイルの代わりに先読み済みの音声から読み込む。
+    """
+    if overlap_seconds * 2 >= chunk_seconds:
+        raise ValueError("重なりは窓の長さの半分未満にしてください")
+
+    window_bytes = int(chunk_seconds * sample_rate) * 2
+    step_bytes = int((chunk_seconds - overlap_seconds) * sample_rate) * 2
+
+    if source is not None:
+        stream = source.open_stream(start_seconds)
+    else:
+        stream = open_pcm_stream(file_path, start_seconds, sample_rate)
+    buffer = bytearray()
+    start_sample = int(start_seconds * sample_rate)
+    eof = False
+    try:
+        while True:
+            # 最後の窓かどうかを判定するため、1窓分より少しだけ多く読み込む
+            while not eof and len(buffer) <= window_bytes:
+                data = stream.read(READ_SIZE)
+                if not data:
+                    eof = True
+                else:
+                    buffer.extend(data)
+
+            if len(buffer) > window_bytes:
+                yield start_sample / sample_rate, pcm_to_float(buffer, window_bytes // 2), False
+                del buffer[:step_bytes]
+                start_sample += step_bytes // 2
+                continue
+
+            if buffer:
+                yield start_sample / sample_rate, pcm_to_float(buffer), True
+            break
+    finally:
+        # 最後まで読み込んだ場合のみデコードの失敗を確認する
+        stream.close(check=eof)
+
+
+def stitch_segments(segments, offset, window_end, is_last, boundary, overlap_seconds):
+    """1窓分のセグメントを絶対時刻に変換し、重なり部分を調整して返す
+
+    boundary: 直前までに確定したセグメントの終了時刻
+    戻り値: (確定したセグメントのリスト, 新しいboundary)
+    """
+    # 次の窓との重なりの中央で区切る
+    cut = window_end - overlap_seconds / 2
+    stitched = []
+    for segment in segments:
+        start = segment["start"] + offset
+        end = segment["end"] + offset
+        # 直前の窓で確定済みの範囲と重なるセグメントは重複として除外
+        if (start + end) / 2 < boundary:
+            continue
+        # 重なりの中央をまたぐ／越えるセグメントは次の窓で確定させる
+        if not is_last and end > cut and (stitched or start >= cut):
+            break
+        item = {"start": start, "end": end, "text": segment["text"]}
+        if "words" in segment:
+            item["words"] = [dict(word, start=word["start"] + offset, end=word["end"] + offset)
+                             for word in segment["words"]]
+        stitched.append(item)
+        boundary = end
+    if not stitched and not is_last:
+        # 窓の中で何も確定しなかった場合は区切り位置までを確定済みとする
+        boundary = max(boundary, cut)
+    return stitched, boundary
+
+
+def transcribe_audio(model, audio, language=None, vad=False, **decode_options):
+    """波形を文字起こしする（vadがTrueの場合は無音区間を除いてからモデルに渡す）"""
+    if vad:
+        return transcribe_with_vad(model, audio, language, **decode_options)
+    result = model.transcribe(audio, language=language, **decode_options)
+    return dict(result, audio_seconds=len(audio) / SAMPLE_RATE, skipped_seconds=0.0)
+
+
+def transcribe_chunked(model, file_path, language=None, chunk_seconds=DEFAULT_CHUNK_SECONDS,
+                       overlap_seconds=DEFAULT_OVERLAP_SECONDS, on_segments=None,
+                       resume_state=None, on_checkpoint=None, vad=False, timer=NULL_TIMER,
+                       source=None, **decode_options):
+    """長時間の音声を窓ごとに文字起こしし、Whisperと同じ形式の結果辞書を返す
+
+    on_segments(segments) は窓ごとに確定したセグメントのリストを引数に呼び出される。
+    on_checkpoint(state) は最後以外の窓の処理後に、そこから再開するための状態を受け取る
+    （state["segments"] はその窓で新たに確定した分のみ）。
+    resume_state には、それまでに受け取った状態を累積したものを渡す。
+    """
+    segments = []
+    boundary = 0.0
+    start_seconds = 0
+    skipped_seconds = 0.0
+    if resume_state:
+        segments = [dict(segment) for segment in resume_state["segments"]]
+        boundary = resume_state["boundary"]
+        start_seconds = resume_state["offset"]
+        language = language or resume_state.get("language")
+
+    windows = stream_audio_windows(file_path, chunk_seconds, overlap_seconds,
+                                   start_seconds=start_seconds, source=source)
+    window_end = None
+    while True:
+        with timer.stage(STAGE_DECODE):
+            window = next(windows, None)
+        if window is None:
+            break
+        offset, audio, is_last = window
+        with timer.stage(STAGE_INFERENCE):
+            result = transcribe_audio(model, audio, language, vad, **decode_options)
+        skipped_seconds += result["skipped_seconds"]
+        # 自動検出の場合は最初の窓で検出した言語を以降の窓でも使用する
+        if language is None:
+            language = result.get("language")
+        window_end = offset + len(audio) / SAMPLE_RATE
+        stitched, boundary = stitch_segments(result.get("segments", []), offset, window_end,
+                                             is_last, boundary, overlap_seconds)
+        for segment in stitched:
+            segment["id"] = len(segments)
+            segments.append(segment)
+        if on_segments and stitched:
+            on_segments(stitched)
+        if on_checkpoint and not is_last:
+            on_checkpoint({
+                "offset": offset + chunk_seconds - overlap_seconds,
+                "boundary": boundary,
+                "language": language,
+                "segments": stitched,
+            })
+
+    # 窓の重なりは数えず、今回処理した範囲の音声の長さを返す
+    audio_seconds = max(0.0, window_end - start_seconds) if window_end is not None else 0.0
+    return {
+        "text": "".join(segment["text"] for segment in segments),
+        "segments": segments,
+        "language": language,
+        "audio_seconds": audio_seconds,
+        "skipped_seconds": skipped_seconds,
+    }
+
+
+def transcribe_file(model, file_path, language=None, chunk_seconds=DEFAULT_CHUNK_SECONDS,
+                    overlap_seconds=DEFAULT_OVERLAP_SECONDS, on_segments=None,
+                    resume_state=None, on_checkpoint=None, vad=False, timer=NULL_TIMER,
+                    source=None, **decode_options):
+    """chunk_secondsが0の場合はファイル全体を一度に、それ以外は分割して文字起こしする
+
+    途中からの再開（resume_state / on_checkpoint）は分割する場合のみ有効。
+    source には先読み済みの音声（prefetch.DecodedAudio）を指定できる。
+    """
+    if chunk_seconds:
+        return transcribe_chunked(model, file_path, language, chunk_seconds,
+                                  overlap_seconds, on_segments, resume_state,
+                                  on_checkpoint, vad, timer, source, **decode_options)
+    with timer.stage(STAGE_DECODE):
+        audio = load_audio(file_path, source=source)
+    with timer.stage(STAGE_INFERENCE):
+        result = transcribe_audio(model, audio, language, vad, **decode_options)
+    # 分割しない場合はファイル全体の処理が終わってからまとめて通知する
+    if on_segments and result.get("segments"):
+        on_segments(result["segments"])
+    return result
@@ -0,0 +1,329 @@
+"""シンプル文字起こしツールのコマンドライン版（Tk不要）
+
+使い方:
+    python -m cli 録音.mp3 "会議/*.m4a" 音声フォルダ/ --model small --language ja -o 出力先
+    python -m cli --watch 受付フォルダ -o 出力先 -j 2
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+
+from autotune import AUTO_MODEL, MODEL_NAMES, CalibrationStore, choose_settings, describe_plan, memory_warning
+from backends import BACKENDS, DEFAULT_BACKEND
+from batching import DEFAULT_BATCH_SIZE
+from chunking import DEFAULT_CHUNK_SECONDS, DEFAULT_OVERLAP_SECONDS
+from engine import AUDIO_EXTENSIONS, TranscriptionEngine, get_default_output_dir
+from exporters import DEFAULT_OUTPUT_FORMATS, OUTPUT_FORMATS, parse_formats
+from instrumentation import RunLog
+from http_service import DEFAULT_HOST, DEFAULT_MAX_QUEUE, DEFAULT_PORT
+from job_manifest import JobManifest
+from job_queue import JobQueue, get_queue_path
+from prefetch import DEFAULT_PREFETCH
+from settings import load_settings
+from transcript_cache import TranscriptCache
+from watcher import DEFAULT_POLL_INTERVAL, DEFAULT_SETTLE_SECONDS
+from worker_pool import default_torch_threads
+
+
+def expand_inputs(inputs, recursive=False):
+    """ファイル・グロブ・ディレクトリの指定を重複のないファイルパスのリストに展開"""
+    file_paths = []
+
+    def add(path):
+        path = os.path.abspath(path)
+        if path not in file_paths:
+            file_paths.append(path)
+
+    for item in inputs:
+        if os.path.isdir(item):
+            if recursive:
+                for dir_path, _, names in os.walk(item):
+                    for name in sorted(names):
+                        if name.lower().endswith(AUDIO_EXTENSIONS):
+                            add(os.path.join(dir_path, name))
+            else:
+                for name in sorted(os.listdir(item)):
+                    path = os.path.join(item, name)
+                    if os.path.isfile(path) and name.lower().endswith(AUDIO_EXTENSIONS):
+                        add(path)
+        elif os.path.isfile(item):
+            add(item)
+        else:
+            matches = sorted(glob.glob(item, recursive=True))
+            if not matches:
+                print(f"警告: 一致するファイルがありません: {item}", file=sys.stderr)
+            for path in matches:
+                if os.path.isfile(path):
+                    add(path)
+    return file_paths
+
+
+def _formats_arg(value):
+    try:
+        return parse_formats(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m cli",
+        description="音声/動画ファイルをWhisperで文字起こしします（GUIなし）",
+    )
+    parser.add_argument("inputs", nargs="*", help="ファイル、グロブパターン、またはディレクトリ")
+    parser.add_argument("-m", "--model", default="tiny", choices=MODEL_NAMES + (AUTO_MODEL,),
+                        help="Whisperモデル（auto: 空きメモリと実測した処理速度からモデル・並列数・"
+                             "スレッド数を自動選択、デフォルト: tiny）")
+    parser.add_argument("--target-minutes", type=float, default=None,
+                        help="auto で目標とする処理時間（分、デフォルト: 音声の合計の長さ）")
+    parser.add_argument("--recalibrate", action="store_true",
+                        help="auto で保存済みの処理速度を使わず計測し直す")
+    parser.add_argument("-b", "--backend", default=DEFAULT_BACKEND, choices=BACKENDS,
+                        help="推論バックエンド（whisper-int8: CPU向けの量子化モデル、"
+                             f"faster-whisper: 要インストール、デフォルト: {DEFAULT_BACKEND}）")
+    parser.add_argument("-l", "--language", default="ja",
+                        help="言語コード、または auto で自動検出（デフォルト: ja）")
+    parser.add_argument("-o", "--output-dir", default=None,
+                        help="出力先ディレクトリ（デフォルト: デスクトップの文字起こし結果フォルダ）")
+    parser.add_argument("-f", "--formats", type=_formats_arg, default=DEFAULT_OUTPUT_FORMATS,
+                        help=f"保存する形式をカンマ区切りで指定（{', '.join(OUTPUT_FORMATS)}、"
+                             f"例: txt,srt,json、デフォルト: {','.join(DEFAULT_OUTPUT_FORMATS)}）")
+    parser.add_argument("--word-timestamps", action="store_true",
+                        help="単語ごとの時刻を求めてJSONに出力する（処理は遅くなります）")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="並列に処理するワーカープロセス数（デフォルト: 1）")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="ワーカーあたりのtorchスレッド数（0: コア数から自動決定）")
+    parser.add_argument("--chunk-seconds", type=float, default=DEFAULT_CHUNK_SECONDS,
+                        help=f"長時間の音声を分割する窓の長さ（秒、0で分割しない、デフォルト: {DEFAULT_CHUNK_SECONDS}）")
+    parser.add_argument("--overlap-seconds", type=float, default=DEFAULT_OVERLAP_SECONDS,
+                        help=f"窓どうしの重なり（秒、デフォルト: {DEFAULT_OVERLAP_SECONDS}）")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"30秒以下の音声をまとめて推論する数（1でまとめない、デフォルト: {DEFAULT_BATCH_SIZE}）")
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_PREFETCH,
+                        help=f"処理中のファイルと並行してデコードしておく後続のファイル数（0で先読みしない、デフォルト: {DEFAULT_PREFETCH}）")
+    parser.add_argument("--vad", action="store_true",
+                        help="無音区間を検出して発話部分だけを文字起こしする")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="文字起こし結果のキャッシュを使用しない")
+    parser.add_argument("--clear-cache", action="store_true",
+                        help="処理の前に文字起こし結果のキャッシュを削除する")
+    parser.add_argument("--restart", action="store_true",
+                        help="前回中断した処理があっても再開せず、最初から処理する")
+    parser.add_argument("--log-dir", default=None,
+                        help="計測結果の実行ログ（JSON Lines）の保存先（デフォルト: ~/.simple_transcriber/logs）")
+    parser.add_argument("--no-log", action="store_true", help="実行ログを記録しない")
+    parser.add_argument("--watch", metavar="DIR", default=None,
+                        help="フォルダを監視し、追加されたファイルを文字起こしし続ける（Ctrl+Cで停止）")
+    parser.add_argument("--settle-seconds", type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help=f"--watch で書き込み完了とみなすまでの無変化の時間（秒、デフォルト: {DEFAULT_SETTLE_SECONDS}）")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+                        help=f"--watch でフォルダを確認する間隔（秒、デフォルト: {DEFAULT_POLL_INTERVAL}）")
+    parser.add_argument("--stats-interval", type=float, default=60.0,
+                        help="--watch でキューの状態を表示する間隔（秒、0で表示しない、デフォルト: 60）")
+    parser.add_argument("--serve", action="store_true",
+                        help="ローカルHTTPサーバーとして起動し、他のプログラムからの依頼を処理し続ける（Ctrl+Cで停止）")
+    parser.add_argument("--host", default=DEFAULT_HOST,
+                        help=f"--serve で待ち受けるアドレス（デフォルト: {DEFAULT_HOST}）")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help=f"--serve で待ち受けるポート（デフォルト: {DEFAULT_PORT}）")
+    parser.add_argument("--max-queue", type=int, default=DEFAULT_MAX_QUEUE,
+                        help=f"--serve で待機できるジョブ数の上限（デフォルト: {DEFAULT_MAX_QUEUE}）")
+    parser.add_argument("--queue-status", action="store_true",
+                        help="出力先の監視用ジョブキューの状態をJSONで表示して終了する")
+    parser.add_argument("-r", "--recursive", action="store_true",
+                        help="ディレクトリをサブフォルダまで再帰的に探索する")
+    parser.add_argument("-q", "--quiet", action="store_true", help="進捗を表示しない")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # ファイルごとに同じ理由で失敗しないよう、窓の設定は処理の前に確認する
+    if args.chunk_seconds and args.overlap_seconds * 2 >= args.chunk_seconds:
+        print("エラー: --overlap-seconds は --chunk-seconds の半分未満にしてください", file=sys.stderr)
+        return 2
+    settings = load_settings()
+
+    transcript_cache = None if args.no_cache else TranscriptCache(
+        max_bytes=settings["transcript_cache_max_mb"] * 1024 ** 2)
+    if args.clear_cache:
+        removed = (transcript_cache or TranscriptCache()).clear()
+        print(f"キャッシュを{removed}件削除しました", file=sys.stderr)
+
+    output_dir = args.output_dir or get_default_output_dir()
+    if args.queue_status:
+        if not os.path.exists(get_queue_path(output_dir)):
+            print(f"エラー: ジョブキューがありません: {get_queue_path(output_dir)}", file=sys.stderr)
+            return 2
+        queue = JobQueue.for_output_dir(output_dir)
+        print(json.dumps(queue.stats(), ensure_ascii=False, indent=2))
+        queue.close()
+        return 0
+
+    if args.serve:
+        file_paths = []
+    elif args.watch:
+        if not os.path.isdir(args.watch):
+            print(f"エラー: 監視するフォルダがありません: {args.watch}", file=sys.stderr)
+            return 2
+        file_paths = []
+    else:
+        file_paths = expand_inputs(args.inputs, recursive=args.recursive)
+        if not file_paths:
+            print("エラー: 処理対象のファイルがありません", file=sys.stderr)
+            return 2
+
+    def on_status(message, progress_value):
+        if not args.quiet:
+            print(f"[{progress_value:5.1f}%] {message}", file=sys.stderr)
+
+    def on_error(message):
+        print(f"エラー: {message}", file=sys.stderr)
+
+    if args.model == AUTO_MODEL:
+        store = CalibrationStore()
+        if args.recalibrate:
+            store.clear()
+        try:
+            plan = choose_settings(
+                file_paths,
+                target_seconds=args.target_minutes * 60 if args.target_minutes else None,
+                target_ratio=settings["auto_target_ratio"], backend=args.backend,
+                language=None if args.language == "auto" else args.language, store=store,
+                on_status=lambda message: on_status(message, 0.0))
+        except Exception as e:
+            print(f"エラー: モデルの自動選択に失敗しました: {str(e)}", file=sys.stderr)
+            return 1
+        if not args.quiet:
+            print(describe_plan(plan), file=sys.stderr)
+        args.model = plan["model"]
+        # フォルダの監視・サーバーでは並列数は -j の指定に従う
+        if not (args.watch or args.serve):
+            args.workers = plan["workers"]
+            args.threads = plan["torch_threads"]
+            warning = plan["warning"]
+        else:
+            warning = memory_warning(args.model, args.backend, args.workers)
+    else:
+        warning = memory_warning(args.model, args.backend, args.workers)
+    if warning:
+        print(f"警告: {warning}", file=sys.stderr)
+
+    run_log = None
+    if not args.no_log and (args.log_dir or settings["write_run_log"]):
+        try:
+            run_log = RunLog.create(args.log_dir)
+        except OSError as e:
+            print(f"警告: 実行ログを作成できません: {str(e)}", file=sys.stderr)
+
+    def make_engine(**overrides):
+        options = dict(
+            model_name=args.model,
+            backend=args.backend,
+            language=args.language,
+            output_dir=output_dir,
+            workers=args.workers,
+            torch_threads=args.threads,
+            chunk_seconds=args.chunk_seconds,
+            overlap_seconds=args.overlap_seconds,
+            vad=args.vad,
+            batch_size=args.batch_size,
+            prefetch=args.prefetch,
+            output_formats=args.formats,
+            word_timestamps=args.word_timestamps,
+            transcript_cache=transcript_cache,
+            run_log=run_log,
+            on_status=on_status,
+            on_error=on_error,
+        )
+        options.update(overrides)
+        return TranscriptionEngine(**options)
+
+    if args.serve:
+        return run_serve(args, output_dir, make_engine)
+    if args.watch:
+        return run_watch(args, output_dir, make_engine)
+
+    engine = make_engine()
+
+    # 出力先のジョブマニフェストから、前回中断した処理の続きを再開する
+    engine.manifest = JobManifest.load_or_create(engine.output_dir, file_paths, engine.job_settings())
+    if args.restart:
+        engine.manifest.reset(file_paths)
+
+    try:
+        results = engine.run(file_paths)
+    except Exception as e:
+        print(f"エラー: 処理中にエラーが発生しました: {str(e)}", file=sys.stderr)
+        return 1
+
+    if run_log is not None and not args.quiet:
+        print(f"実行ログ: {run_log.path}", file=sys.stderr)
+
+    failed = [r for r in results if r["error"] or not r["saved"]]
+    for entry in failed:
+        print(f"失敗: {entry['path']}: {entry['error'] or '保存失敗'}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def _resident_setup(args, make_engine):
+    """常駐処理用の (ワーカーごとのエンジンを作る関数, 状態を表示する関数) を返す
+
+    常駐中はワーカーごとにモデルを読み込んだまま、スレッドで1ファイルずつ処理する。
+    """
+    torch_threads = args.threads or default_torch_threads(args.workers)
+
+    def make_worker_engine():
+        return make_engine(workers=1, torch_threads=torch_threads, on_status=None)
+
+    def on_status(message):
+        if not args.quiet:
+            print(message, file=sys.stderr)
+
+    return make_worker_engine, on_status
+
+
+def run_watch(args, output_dir, make_engine):
+    """監視フォルダの常駐処理を実行する（Ctrl+Cで停止）"""
+    from watch_service import WatchService
+
+    make_worker_engine, on_status = _resident_setup(args, make_engine)
+
+    def on_stats(stats):
+        if not args.quiet:
+            print(f"キュー: 待機 {stats['queue_depth']}件、処理中 {stats['busy_workers']}件、"
+                  f"完了 {stats['counts']['done']}件、失敗 {stats['counts']['failed']}件、"
+                  f"直近1時間 {stats['recent_files']}件", file=sys.stderr)
+
+    service = WatchService(
+        args.watch, output_dir, make_worker_engine, workers=args.workers,
+        recursive=args.recursive, settle_seconds=args.settle_seconds,
+        poll_interval=args.poll_interval, stats_interval=args.stats_interval or float("inf"),
+        on_status=on_status, on_stats=on_stats)
+    service.serve_forever()
+    return 0
+
+
+def run_serve(args, output_dir, make_engine):
+    """ローカルHTTPサーバーとして依頼を処理し続ける（Ctrl+Cで停止）"""
+    from http_service import TranscriptionService, serve
+
+    # 同時に届いた依頼はキューに入れ、モデルを読み込んだままのワーカーが順に処理する
+    make_worker_engine, on_status = _resident_setup(args, make_engine)
+    service = TranscriptionService(
+        output_dir, make_worker_engine, workers=args.workers, max_queue=args.max_queue, on_status=on_status)
+    try:
+        serve(service, args.host, args.port, quiet=args.quiet, on_status=on_status)
+    except OSError as e:
+        print(f"エラー: サーバーを起動できません: {str(e)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,587 @@
+import itertools
+import os
+import time
+
+from audio import SAMPLE_RATE, read_short_audio
+from backends import DEFAULT_BACKEND
+from batching import BATCH_MAX_SECONDS, DEFAULT_BATCH_SIZE, supports_batching, transcribe_batch
+from chunking import (DEFAULT_CHUNK_SECONDS, DEFAULT_OVERLAP_SECONDS, transcribe_audio,
+                      transcribe_file)
+from exporters import DEFAULT_OUTPUT_FORMATS, export_result
+from instrumentation import (STAGE_DECODE, STAGE_INFERENCE, STAGE_MODEL_LOAD, STAGE_SAVE,
+                             StageTimer, ThroughputMeter, current_rss_bytes, peak_rss_bytes,
+                             rss_growth_bytes)
+from model_cache import resolve_loader
+from prefetch import DEFAULT_PREFETCH, AudioPrefetcher
+from transcript_cache import make_cache_key
+from worker_pool import iter_parallel_transcriptions, set_torch_threads
+
+# 対応する音声/動画ファイルの拡張子
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".mp4", ".avi", ".mov", ".ogg", ".flac", ".m4a")
+
+
+def get_default_output_dir():
+    """デフォルトの出力ディレクトリ（デスクトップの文字起こし結果フォルダ）を取得"""
+    desktop_path = os.path.join(os.path.expanduser("~"), "Desktop")
+    return os.path.join(desktop_path, "文字起こし結果")
+
+
+def format_duration(seconds):
+    """秒数を「1時間2分3秒」の形式で返す"""
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}時間{minutes}分{seconds}秒"
+    if minutes:
+        return f"{minutes}分{seconds}秒"
+    return f"{seconds}秒"
+
+
+def get_output_path(output_dir, file_name, ext=".txt"):
+    """元のファイル名から拡張子を除去し、出力ファイルのパスを返す"""
+    base_name = os.path.splitext(os.path.basename(file_name))[0]
+    return os.path.join(output_dir, f"{base_name}{ext}")
+
+
+class PartialTextWriter:
+    """処理中のセグメントを <出力名>.txt.part に逐次追記する
+
+    クラッシュや中断の際にも、それまでに確定したテキストがディスクに残る。
+    正常に完了した場合は discard() で削除する。
+    """
+
+    def __init__(self, output_dir, file_name):
+        self.path = get_output_path(output_dir, file_name, ".txt.part")
+        self._file = None
+
+    def write_segments(self, segments):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = open(self.path, 'w', encoding='utf-8')
+        self._file.write("".join(segment["text"] for segment in segments))
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class TranscriptionEngine:
+    """GUIとCLIで共有する文字起こし処理本体
+
+    Tkには依存せず、進捗やエラーはコールバックで通知する。
+    """
+
+    def __init__(self, model_name="tiny", language="ja", output_dir=None,
+                 workers=1, torch_threads=None, chunk_seconds=DEFAULT_CHUNK_SECONDS,
+                 overlap_seconds=DEFAULT_OVERLAP_SECONDS, vad=False, model_cache=None,
+                 transcript_cache=None, manifest=None, model_loader=None, run_log=None,
+                 backend=DEFAULT_BACKEND, batch_size=DEFAULT_BATCH_SIZE, prefetch=DEFAULT_PREFETCH,
+                 output_formats=DEFAULT_OUTPUT_FORMATS, word_timestamps=False,
+                 on_status=None, on_error=None, on_segments=None, on_file_done=None):
+        self.model_name = model_name
+        # 推論バックエンド（backends.BACKENDS のいずれか）
+        self.backend = backend
+        # 言語が自動検出の場合は None を指定
+        self.language = None if language == "auto" else language
+        self.output_dir = output_dir or get_default_output_dir()
+        # workers > 1 の場合はファイル単位でプロセス並列に処理する
+        self.workers = max(1, workers)
+        self.torch_threads = torch_threads
+        # 長時間の音声は固定長の窓に分割して処理する（0の場合は分割しない）
+        self.chunk_seconds = chunk_seconds
+        self.overlap_seconds = overlap_seconds
+        # 無音区間を検出し、発話部分だけをモデルに渡す
+        self.vad = vad
+        # 30秒以下の音声はこの数ずつまとめて推論する（1以下の場合はまとめない）
+        self.batch_size = batch_size
+        # 処理中のファイルの推論と並行して、この数だけ先のファイルまでデコードしておく（0の場合は先読みしない）
+        self.prefetch = prefetch
+        # 保存する形式（exporters.OUTPUT_FORMATS）。1回の文字起こし結果から全て書き出す
+        self.output_formats = tuple(output_formats) or DEFAULT_OUTPUT_FORMATS
+        # 単語ごとの時刻を求める（JSONに出力される。推論は遅くなる）
+        self.word_timestamps = word_timestamps
+        # 指定された場合は読み込み済みモデルを実行間で使い回す
+        self.model_cache = model_cache
+        # 指定された場合は同じ音声・設定の文字起こし結果を再利用する
+        self.transcript_cache = transcript_cache
+        # 指定された場合は完了済みのファイルを飛ばし、チェックポイントから再開する
+        self.manifest = manifest
+        # "モジュール名:関数名" 形式でモデルの読み込み関数を差し替える（ベンチマーク用など）
+        self.model_loader = model_loader
+        # 指定された場合はファイルごとの計測結果を記録する（instrumentation.RunLog）
+        self.run_log = run_log
+        self.on_status = on_status
+        self.on_error = on_error
+        # on_segments(index, file_path, segments): 確定したセグメントを処理中に逐次通知
+        # on_file_done(entry): ファイルごとの処理完了（成功・失敗とも）を通知
+        self.on_segments = on_segments
+        self.on_file_done = on_file_done
+        self.model = None
+        # 処理段階ごとの所要時間（並列処理の場合は全ワーカーの合計）。run() ごとに計測し直す
+        self.timer = StageTimer()
+        # モデルの読み込み時間（読み込んだ run() の計測にも含まれる）
+        self.model_load_seconds = None
+        self._writers = {}
+        self._streamed_counts = {}
+        self._file_paths = []
+        # 処理済みのファイルサイズから残り時間を推定する
+        self._meter = ThroughputMeter(0)
+        self._task_sizes = {}
+        # 処理中のファイルの途中経過を処理量に換算するための、音声1秒あたりのファイルサイズ
+        # （最初のファイルが完了するまでは16kHz モノラル 16bitのWAVとみなす）
+        self._bytes_per_second = SAMPLE_RATE * 2
+
+    def transcribe_options(self):
+        """結果に影響する文字起こしの設定（chunking.transcribe_file に渡す）"""
+        options = {
+            "chunk_seconds": self.chunk_seconds,
+            "overlap_seconds": self.overlap_seconds,
+            "vad": self.vad,
+        }
+        # 既定値の場合は渡さず、以前のキャッシュ・マニフェストとの互換性を保つ
+        if self.word_timestamps:
+            options["word_timestamps"] = True
+        return options
+
+    def job_settings(self):
+        """再開時に前回と一致している必要がある設定（ジョブマニフェストに記録する）"""
+        settings = dict(self.transcribe_options(), model=self.model_name, language=self.language,
+                        backend=self.backend)
+        # 完了の判定は最初の形式のファイルで行うため、形式が変わった場合は最初から処理し直す
+        # （既定値の場合は記録せず、以前のマニフェストとの互換性を保つ）
+        if self.output_formats != DEFAULT_OUTPUT_FORMATS:
+            settings["output_formats"] = list(self.output_formats)
+        return settings
+
+    def _status(self, message, progress_value):
+        if self.on_status:
+            self.on_status(message, progress_value)
+
+    def _error(self, message):
+        if self.on_error:
+            self.on_error(message)
+
+    def load_model(self):
+        """Whisperモデルを読み込む（初回は自動ダウンロード）"""
+        if self.model is None:
+            set_torch_threads(self.torch_threads)
+            start = time.perf_counter()
+            if self.model_cache is not None and not self.model_loader:
+                self.model = self.model_cache.get(self.model_name, backend=self.backend)
+            else:
+                self.model = resolve_loader(self.model_loader)(self.model_name, None,
+                                                               self.backend)
+            self.model_load_seconds = time.perf_counter() - start
+            self.timer.add(STAGE_MODEL_LOAD, self.model_load_seconds)
+        return self.model
+
+    def transcribe_file(self, file_path, on_segments=None, resume_state=None, on_checkpoint=None,
+                        timer=None, source=None):
+        """1ファイルを文字起こしし、Whisperの結果辞書を返す"""
+        model = self.load_model()
+        return transcribe_file(model, file_path, self.language, on_segments=on_segments,
+                               resume_state=resume_state, on_checkpoint=on_checkpoint,
+                               timer=timer or self.timer, source=source,
+                               **self.transcribe_options())
+
+    def _handle_segments(self, index, segments):
+        """確定したセグメントを途中結果ファイルに追記し、コールバックに渡す"""
+        writer = self._writers.get(index)
+        if writer is None:
+            # 完了済みのファイルに遅れて届いたセグメントは無視する
+            return
+        self._streamed_counts[index] = self._streamed_counts.get(index, 0) + len(segments)
+        try:
+            writer.write_segments(segments)
+        except OSError as write_error:
+            print(f"途中結果の書き込みに失敗しました: {str(write_error)}")
+        if self.on_segments:
+            self.on_segments(index, self._file_paths[index], segments)
+
+    def _handle_checkpoint(self, index, state):
+        """窓の区切りごとの処理状態をマニフェストに記録し、推定残り時間を更新する"""
+        if index not in self._writers:
+            return
+        self._update_progress(index, state["offset"])
+        if self.manifest is None:
+            return
+        try:
+            self.manifest.checkpoint(self._file_paths[index], state)
+        except OSError as manifest_error:
+            print(f"チェックポイントの保存に失敗しました: {str(manifest_error)}")
+
+    def _update_progress(self, index, offset):
+        """処理中のファイルの処理済みの位置（秒）を処理量に換算し、推定残り時間を通知する"""
+        size = self._task_sizes.get(index, 0)
+        self._meter.update(index, min(size, offset * self._bytes_per_second))
+        self._status(f"{os.path.basename(self._file_paths[index])}: {format_duration(offset)}まで"
+                     f"処理しました{self._eta_text()}",
+                     self._progress_value(index, len(self._file_paths)))
+
+    def _update_manifest(self, entry):
+        """ファイルの処理結果をマニフェストに記録する"""
+        if self.manifest is None or entry["resumed"]:
+            return
+        try:
+            if entry["saved"]:
+                self.manifest.mark_done(entry["path"], entry["output_file"])
+            else:
+                self.manifest.mark_failed(entry["path"], entry["error"] or "保存失敗")
+        except OSError as manifest_error:
+            print(f"マニフェストの保存に失敗しました: {str(manifest_error)}")
+
+    def _file_done(self, entry):
+        self._update_manifest(entry)
+        if entry["resumed"]:
+            status = "resumed"
+        elif entry["cached"]:
+            status = "cached"
+        else:
+            status = "done" if entry["saved"] else "failed"
+        self._log("file", index=entry["index"], path=entry["path"], status=status,
+                  output_file=entry["output_file"], error=entry["error"],
+                  skipped_seconds=entry["skipped_seconds"], **(entry["metrics"] or {}))
+        if self.on_file_done:
+            self.on_file_done(entry)
+
+    def _log(self, event, **fields):
+        if self.run_log is None:
+            return
+        try:
+            self.run_log.write(event, **fields)
+        except OSError as log_error:
+            print(f"実行ログの書き込みに失敗しました: {str(log_error)}")
+
+    def _eta_text(self):
+        """推定残り時間の表示（推定できない場合は空文字列）"""
+        eta = self._meter.eta_seconds()
+        if eta is None or self._meter.processed >= self._meter.total:
+            return ""
+        return f"（残り約{format_duration(eta)}）"
+
+    def _progress_value(self, done_files, total_files):
+        """全体の10%をモデルの準備に使用し、残りの90%を処理済みの割合に応じて進める
+
+        文字起こしするファイルの処理量はファイルサイズで見積もる。
+        """
+        if self._meter.total:
+            fraction = min(1.0, self._meter.processed / self._meter.total)
+        else:
+            fraction = done_files / total_files
+        return 10 + fraction * 90
+
+    def _cache_key(self, file_path):
+        """キャッシュキーを返す（キャッシュ無効時や計算できない場合はNone）"""
+        if self.transcript_cache is None:
+            return None
+        try:
+            return make_cache_key(file_path, self.model_name, self.language,
+                                  backend=self.backend, **self.transcribe_options())
+        except OSError:
+            return None
+
+    def _iter_serial(self, tasks, total_files):
+        """1プロセスで順番に処理し、(index, path, result, error) を返すジェネレータ"""
+        # 先読みはモデルの読み込み中から始める（途中から再開するファイルはその位置から直接デコードする）
+        prefetcher = None
+        if self.prefetch > 0:
+            prefetcher = AudioPrefetcher([path for _, path, resume_state in tasks if not resume_state],
+                                         prefetch=self.prefetch)
+        batch = []
+        try:
+            # モデルの準備
+            if self.model is None:
+                self._status("モデルを準備中...", 10)
+                self.load_model()
+
+            self._meter.start()
+            # バッチ推論では単語ごとの時刻を求められないため、その場合はまとめない
+            use_batch = (self.batch_size > 1 and not self.word_timestamps
+                         and supports_batching(self.model))
+            for i, file_path, resume_state in tasks:
+                self._status(f"ファイル {i+1}/{total_files} を処理中: {os.path.basename(file_path)}"
+                             f"{self._eta_text()}", self._progress_value(i, total_files))
+                source = prefetcher.get(file_path) if prefetcher and not resume_state else None
+                try:
+                    yield from self._iter_serial_file(i, file_path, resume_state, source, use_batch,
+                                                      batch)
+                finally:
+                    if source is not None:
+                        source.close()
+                if batch and len(batch) >= self.batch_size:
+                    yield from self._iter_batch(batch, total_files)
+                    batch = []
+            if batch:
+                yield from self._iter_batch(batch, total_files)
+        finally:
+            if prefetcher is not None:
+                prefetcher.close()
+
+    def _iter_serial_file(self, i, file_path, resume_state, source, use_batch, batch):
+        """1ファイルを処理して結果を返す（短い音声は推論せず batch に加える）"""
+        timer = StageTimer()
+        start = time.perf_counter()
+        rss_before = current_rss_bytes()
+        if use_batch and not resume_state:
+            # 短い音声はデコードしておき、まとめて推論する
+            try:
+                with timer.stage(STAGE_DECODE):
+                    audio = read_short_audio(file_path, BATCH_MAX_SECONDS, source=source)
+            except Exception as file_error:
+                yield i, file_path, None, str(file_error)
+                return
+            if audio is not None:
+                batch.append((i, file_path, audio, timer, time.perf_counter() - start))
+                return
+        try:
+            result = self.transcribe_file(
+                file_path,
+                on_segments=lambda segments: self._handle_segments(i, segments),
+                resume_state=resume_state,
+                on_checkpoint=lambda state: self._handle_checkpoint(i, state),
+                timer=timer, source=source)
+            # ワーカープロセスの結果と同じ形式で計測結果を付け加える
+            result = dict(result, timings=timer.as_dict(),
+                          elapsed_seconds=time.perf_counter() - start,
+                          peak_rss_bytes=peak_rss_bytes(),
+                          rss_growth_bytes=rss_growth_bytes(rss_before))
+            yield i, file_path, result, None
+        except Exception as file_error:
+            yield i, file_path, None, str(file_error)
+
+    def _iter_batch(self, batch, total_files):
+        """まとめた短い音声を1回の推論で処理し、(index, path, result, error) を返すジェネレータ
+
+        batch は (index, path, 波形, StageTimer, デコード時間) のリスト。
+        """
+        self._status(f"{len(batch)}個の短い音声をまとめて処理中...{self._eta_text()}",
+                     self._progress_value(batch[0][0], total_files))
+        audios = [audio for _, _, audio, _, _ in batch]
+        start = time.perf_counter()
+        try:
+            results = transcribe_batch(self.model, audios, self.language, self.vad)
+        except Exception as batch_error:
+            # まとめて処理できなかった場合は1ファイルずつ処理し直す
+            print(f"バッチ処理に失敗したため個別に処理します: {str(batch_error)}")
+            results = []
+            for audio in audios:
+                try:
+                    results.append(transcribe_audio(self.model, audio, self.language, self.vad))
+                except Exception as file_error:
+                    results.append(file_error)
+        # バッチ全体の推論時間は各音声に均等に割り当てる
+        share = (time.perf_counter() - start) / len(batch)
+        for (i, file_path, _, timer, decode_seconds), result in zip(batch, results):
+            if isinstance(result, Exception):
+                yield i, file_path, None, str(result)
+                continue
+            timer.add(STAGE_INFERENCE, share)
+            yield i, file_path, dict(result, timings=timer.as_dict(),
+                                     elapsed_seconds=decode_seconds + share,
+                                     peak_rss_bytes=peak_rss_bytes()), None
+
+    def _iter_parallel(self, tasks):
+        """ワーカープールで並列に処理し、完了した順に結果を返すジェネレータ"""
+        workers = min(self.workers, len(tasks))
+        self._status(f"{workers}個のワーカーでモデルを準備中...", 10)
+        # 並列処理ではワーカーのモデル読み込みも含めた処理速度から推定する
+        self._meter.start()
+        return iter_parallel_transcriptions(tasks, self.model_name, self.language,
+                                            workers, self.torch_threads,
+                                            self.transcribe_options(),
+                                            on_segments=self._handle_segments,
+                                            on_checkpoint=self._handle_checkpoint,
+                                            model_loader=self.model_loader,
+                                            backend=self.backend)
+
+    @staticmethod
+    def _file_metrics(result, file_timer):
+        """1ファイルの処理時間・音声の長さ・実時間比・メモリ使用量
+
+        process_peak_rss_bytes はそのファイルの完了時点でのプロセスの最大常駐メモリ
+        （それまでのファイルの分も含む）、rss_growth_bytes はそのファイルの処理の前後での
+        常駐メモリの増加量（まとめて推論した場合は計測しない）。
+        """
+        stages = file_timer.as_dict()
+        elapsed = (result.get("elapsed_seconds") or 0.0) + stages.get(STAGE_SAVE, {}).get("seconds", 0.0)
+        audio_seconds = result.get("audio_seconds")
+        return {
+            "elapsed_seconds": elapsed,
+            "audio_seconds": audio_seconds,
+            "rtf": elapsed / audio_seconds if audio_seconds else None,
+            "process_peak_rss_bytes": result.get("peak_rss_bytes"),
+            "rss_growth_bytes": result.get("rss_growth_bytes"),
+            "stages": stages,
+        }
+
+    def run(self, file_paths):
+        """ファイルを文字起こしして自動保存し、ファイルごとの結果リストを入力順で返す"""
+        total_files = len(file_paths)
+        results = []
+        self._file_paths = list(file_paths)
+        # 常駐サービスなどで同じエンジンを繰り返し使う場合も、この実行の分だけを集計する
+        self.timer = StageTimer()
+        run_start = time.perf_counter()
+        self._log("run_start", files=total_files, workers=self.workers,
+                  torch_threads=self.torch_threads, settings=self.job_settings())
+
+        # 前回完了済み・キャッシュ済みのファイルはモデルに渡さない
+        cache_keys = {}
+        resumed = []
+        cached = []
+        tasks = []
+        for index, file_path in enumerate(file_paths):
+            if self.manifest is not None and self.manifest.is_done(file_path):
+                output_file = self.manifest.get_output_file(file_path)
+                try:
+                    with open(output_file, 'r', encoding='utf-8') as f:
+                        resumed.append((index, file_path, {"text": f.read()}, None))
+                    continue
+                except OSError:
+                    pass
+            key = cache_keys[index] = self._cache_key(file_path)
+            result = self.transcript_cache.get(key) if key else None
+            if result is not None:
+                cached.append((index, file_path, result, None))
+                continue
+            resume_state = self.manifest.get_checkpoint(file_path) if self.manifest else None
+            tasks.append((index, file_path, resume_state))
+            self._writers[index] = PartialTextWriter(self.output_dir, file_path)
+            if resume_state and resume_state["segments"]:
+                # チェックポイントまでの結果を途中結果ファイルと結果欄に復元する
+                self._handle_segments(index, resume_state["segments"])
+
+        resumed_indices = {index for index, _, _, _ in resumed}
+        task_indices = {index for index, _, _ in tasks}
+        partial_indices = {index for index, _, resume_state in tasks if resume_state}
+        task_sizes = self._task_sizes = {}
+        for index, file_path, _ in tasks:
+            try:
+                task_sizes[index] = os.path.getsize(file_path)
+            except OSError:
+                task_sizes[index] = 0
+        self._meter = ThroughputMeter(sum(task_sizes.values()))
+        if not tasks:
+            computed = []
+        elif self.workers > 1 and len(tasks) > 1:
+            computed = self._iter_parallel(tasks)
+        else:
+            computed = self._iter_serial(tasks, total_files)
+
+        try:
+            for index, file_path, result, error in itertools.chain(resumed, cached, computed):
+                file_name = os.path.basename(file_path)
+                entry = {"index": index, "file": file_name, "path": file_path, "text": "",
+                         "saved": False, "output_file": None, "output_files": {}, "error": error,
+                         "resumed": index in resumed_indices, "skipped_seconds": 0.0,
+                         "cached": index not in task_indices and index not in resumed_indices,
+                         "metrics": None}
+                results.append(entry)
+                self._meter.add(task_sizes.get(index, 0), key=index)
+                # 最初から処理したファイルの大きさと長さから、途中経過の換算に使う比率を求める
+                if (result is not None and index in task_indices and index not in partial_indices
+                        and result.get("audio_seconds") and task_sizes.get(index)):
+                    self._bytes_per_second = task_sizes[index] / result["audio_seconds"]
+                done_progress = self._progress_value(len(results), total_files)
+
+                # 並列処理ではセグメントが完了通知より遅れて届くことがあるため、未通知の分をここで渡す
+                if result is not None and index in self._writers:
+                    remaining = result.get("segments", [])[self._streamed_counts.pop(index, 0):]
+                    if remaining:
+                        self._handle_segments(index, remaining)
+
+                # 途中結果ファイルはエラー時には残し、成功時は最終結果の保存後に削除する
+                writer = self._writers.pop(index, None)
+                if writer is not None:
+                    writer.close()
+
+                if error:
+                    self._status(f"ファイル {file_name} の処理中にエラーが発生しました: {error}"
+                                 f"{self._eta_text()}", done_progress)
+                    self._file_done(entry)
+                    continue
+                entry["text"] = result["text"]
+                if entry["resumed"]:
+                    entry["output_file"] = self.manifest.get_output_file(file_path)
+                    entry["saved"] = True
+                    self._status(f"ファイル {len(results)}/{total_files} は前回完了済みです: {file_name}",
+                                 done_progress)
+                    self._file_done(entry)
+                    continue
+                entry["skipped_seconds"] = result.get("skipped_seconds") or 0.0
+                file_timer = StageTimer()
+                file_timer.merge(result.get("timings", {}))
+                if entry["cached"] and self.on_segments and result.get("segments"):
+                    self.on_segments(index, file_path, result["segments"])
+
+                if not entry["cached"] and cache_keys[index]:
+                    try:
+                        self.transcript_cache.put(cache_keys[index], result)
+                    except OSError as cache_error:
+                        print(f"キャッシュの保存に失敗しました: {str(cache_error)}")
+
+                # 自動保存
+                try:
+                    with file_timer.stage(STAGE_SAVE):
+                        output_files = export_result(self.output_dir, file_name, result,
+                                                     self.output_formats)
+                    entry["output_files"] = output_files
+                    # 再開時の判定などには最初の形式のファイルを使う
+                    entry["output_file"] = output_files[self.output_formats[0]]
+                    entry["saved"] = True
+                    if writer is not None:
+                        writer.discard()
+                except Exception as save_error:
+                    self._error(f"ファイル {file_name} の保存中にエラーが発生しました: {str(save_error)}")
+
+                self.timer.merge(file_timer.as_dict())
+                if not entry["cached"]:
+                    entry["metrics"] = self._file_metrics(result, file_timer)
+
+                if entry["cached"]:
+                    detail = "（キャッシュ）"
+                elif entry["skipped_seconds"]:
+                    detail = f"（無音 {format_duration(entry['skipped_seconds'])} をスキップ）"
+                else:
+                    detail = ""
+                self._status(f"ファイル {len(results)}/{total_files} の処理が完了しました{detail}: {file_name}"
+                             f"{self._eta_text()}", done_progress)
+                self._file_done(entry)
+        finally:
+            # 中断された場合も途中結果ファイルは閉じて残しておく
+            for writer in self._writers.values():
+                writer.close()
+            self._writers.clear()
+            self._streamed_counts.clear()
+
+        # 全て完了した場合はマニフェストを削除し、次回は最初から処理する
+        if self.manifest is not None and self.manifest.all_done():
+            self.manifest.remove()
+
+        results.sort(key=lambda r: r["index"])
+        saved_count = sum(1 for r in results if r["saved"])
+        cached_count = sum(1 for r in results if r["cached"])
+        skipped_seconds = sum(r["skipped_seconds"] for r in results if not r["cached"])
+        vad_status = f"、無音 {format_duration(skipped_seconds)} の処理を省略" if skipped_seconds else ""
+        wall_seconds = time.perf_counter() - run_start
+        audio_seconds = sum(r["metrics"]["audio_seconds"] or 0 for r in results if r["metrics"])
+        self._log("run_end", files=total_files, saved=saved_count, cached=cached_count,
+                  failed=sum(1 for r in results if not r["saved"]),
+                  wall_seconds=wall_seconds, audio_seconds=audio_seconds,
+                  rtf=wall_seconds / audio_seconds if audio_seconds else None,
+                  skipped_seconds=skipped_seconds, stages=self.timer.as_dict(),
+                  model_load_seconds=self.model_load_seconds,
+                  peak_rss_bytes=peak_rss_bytes(include_children=self.workers > 1))
+        self._status(f"{total_files}個のファイルの文字起こしが完了しました"
+                     f"（{saved_count}個保存、{cached_count}個キャッシュ{vad_status}）", 100)
+        return results
@@ -0,0 +1,129 @@
+"""文字起こし結果の書き出し（テキスト・字幕・JSON）
+
+1回の文字起こし結果（Whisperの結果辞書）から、選択された形式のファイルを
+まとめて書き出す。字幕やJSONはセグメントごとに逐次書き込み、一時ファイルに
+書き終えてから置き換えるため、書き込み途中の状態で既存の結果を上書きしない。
+"""
+import json
+import os
+
+# 対応する出力形式（拡張子）
+OUTPUT_FORMATS = ("txt", "srt", "vtt", "tsv", "json")
+DEFAULT_OUTPUT_FORMATS = ("txt",)
+
+
+def format_timestamp(seconds, decimal_marker=".", always_include_hours=True):
+    """秒数を 00:01:02.345 の形式で返す"""
+    milliseconds = int(round(max(0.0, seconds) * 1000))
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    hours_marker = f"{hours:02d}:" if always_include_hours or hours else ""
+    return f"{hours_marker}{minutes:02d}:{seconds:02d}{decimal_marker}{milliseconds:03d}"
+
+
+def _subtitle_text(segment):
+    # 字幕では行頭の空白と、区切りと解釈される "-->" を取り除く
+    return segment["text"].strip().replace("-->", "->")
+
+
+def write_txt(f, result):
+    f.write(result.get("text", ""))
+
+
+def write_srt(f, result):
+    number = 0
+    for segment in result.get("segments") or []:
+        text = _subtitle_text(segment)
+        if not text:
+            continue
+        number += 1
+        f.write(f"{number}\n"
+                f"{format_timestamp(segment['start'], ',')} --> {format_timestamp(segment['end'], ',')}\n"
+                f"{text}\n\n")
+
+
+def write_vtt(f, result):
+    f.write("WEBVTT\n\n")
+    for segment in result.get("segments") or []:
+        text = _subtitle_text(segment)
+        if not text:
+            continue
+        f.write(f"{format_timestamp(segment['start'])} --> {format_timestamp(segment['end'])}\n"
+                f"{text}\n\n")
+
+
+def write_tsv(f, result):
+    """開始・終了（ミリ秒）とテキストのタブ区切り（Whisperのtsv出力と同じ形式）"""
+    f.write("start\tend\ttext\n")
+    for segment in result.get("segments") or []:
+        text = segment["text"].strip().replace("\t", " ").replace("\n", " ")
+        f.write(f"{int(round(segment['start'] * 1000))}\t{int(round(segment['end'] * 1000))}\t{text}\n")
+
+
+def write_json(f, result):
+    """テキスト・言語とセグメント（単語ごとの時刻がある場合はそれも）をJSONで書き出す
+
+    長い音声でも結果全体を1つの文字列にしないよう、セグメントを1件ずつ書き込む。
+    """
+    f.write('{"language": ')
+    f.write(json.dumps(result.get("language"), ensure_ascii=False))
+    f.write(', "text": ')
+    f.write(json.dumps(result.get("text", ""), ensure_ascii=False))
+    f.write(', "segments": [')
+    for i, segment in enumerate(result.get("segments") or []):
+        item = {"id": i, "start": segment["start"], "end": segment["end"], "text": segment["text"]}
+        if "words" in segment:
+            item["words"] = [{"word": word["word"], "start": word["start"], "end": word["end"],
+                              "probability": word.get("probability")}
+                             for word in segment["words"]]
+        f.write(",\n" if i else "\n")
+        f.write(json.dumps(item, ensure_ascii=False))
+    f.write("\n]}\n")
+
+
+WRITERS = {
+    "txt": write_txt,
+    "srt": write_srt,
+    "vtt": write_vtt,
+    "tsv": write_tsv,
+    "json": write_json,
+}
+
+
+def parse_formats(value):
+    """"txt,srt" のようなカンマ区切りの指定を形式のタプルに変換する（不明な形式はValueError）"""
+    formats = []
+    for name in value.split(","):
+        name = name.strip().lower().lstrip(".")
+        if not name:
+            continue
+        if name not in WRITERS:
+            raise ValueError(f"対応していない出力形式です: {name}（{', '.join(OUTPUT_FORMATS)} から選択）")
+        if name not in formats:
+            formats.append(name)
+    if not formats:
+        raise ValueError("出力形式を1つ以上指定してください")
+    return tuple(formats)
+
+
+def export_result(output_dir, file_name, result, formats=DEFAULT_OUTPUT_FORMATS):
+    """結果を指定された形式で保存し、{形式: 保存先のパス} を返す（失敗時は例外を送出）"""
+    os.makedirs(output_dir, exist_ok=True)
+    base_name = os.path.splitext(os.path.basename(file_name))[0]
+    paths = {}
+    for name in formats:
+        output_file = os.path.join(output_dir, f"{base_name}.{name}")
+        temp_file = output_file + ".tmp"
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                WRITERS[name](f, result)
+            os.replace(temp_file, output_file)
+        except BaseException:
+            try:
+                os.remove(temp_file)
+            except OSError:
+                pass
+            raise
+        paths[name] = output_file
+    return paths
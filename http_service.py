@@ -0,0 +1,412 @@
+"""ローカルHTTPサーバーによる文字起こしサービス
+
+他のプログラムからファイルのパス、または音声データそのものを送って文字起こしを
+依頼できるようにする。依頼はジョブとしてキューに入り、モデルを読み込んだまま
+常駐する一定数のワーカーが順に処理する（クライアントごとにモデルを読み込まない）。
+結果は出力先の下のジョブIDのフォルダに保存するため、同じ名前のファイルの依頼が
+同時に届いても互いの結果を上書きしない。
+
+エンドポイント:
+    POST /jobs                  {"path": "..."} のJSON、または音声データ本体（?filename=名前）
+    GET  /jobs/<id>             ジョブの状態（完了後はテキストと出力ファイル）
+    GET  /jobs/<id>/segments    確定したセグメント（?from=N で N件目以降）
+    GET  /jobs/<id>/stream      確定したセグメントを完了までJSON Linesで逐次返す
+    GET  /health                稼働状態
+    GET  /metrics               キューの深さ・処理速度などの統計情報
+"""
+import collections
+import json
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from engine import AUDIO_EXTENSIONS
+from instrumentation import StageTimer, peak_rss_bytes
+from resident import ResidentWorkers
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# 待機できるジョブ数の上限（超えた場合は 503 を返す）
+DEFAULT_MAX_QUEUE = 100
+# 保持する完了済みジョブの数（古いものから破棄する）
+MAX_FINISHED_JOBS = 1000
+# アップロードできるファイルサイズの上限
+MAX_UPLOAD_BYTES = 2 * 1024 ** 3
+# /stream で新しいセグメントを待つ間隔（秒）
+_STREAM_WAIT_SECONDS = 15.0
+
+STATE_QUEUED = "queued"
+STATE_RUNNING = "running"
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+
+
+def remove_upload(path):
+    """save_upload で保存したファイルを、依頼ごとのフォルダごと削除する"""
+    shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+
+class TranscriptionJob:
+    """1件の文字起こしの依頼と、その途中経過・結果"""
+
+    def __init__(self, path, file_name, upload=False):
+        self.id = uuid.uuid4().hex
+        self.path = path
+        self.file_name = file_name
+        # アップロードされたファイルは処理後に削除する
+        self.upload = upload
+        self.state = STATE_QUEUED
+        self.segments = []
+        self.entry = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cond = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.state in (STATE_DONE, STATE_FAILED)
+
+    def add_segments(self, segments):
+        with self._cond:
+            self.segments.extend({"start": s["start"], "end": s["end"], "text": s["text"]}
+                                 for s in segments)
+            self._cond.notify_all()
+
+    def set_state(self, state, entry=None, error=None):
+        with self._cond:
+            self.state = state
+            if state == STATE_RUNNING:
+                self.started_at = time.time()
+            elif state in (STATE_DONE, STATE_FAILED):
+                self.finished_at = time.time()
+                self.entry = entry
+                self.error = error
+            self._cond.notify_all()
+
+    def wait_segments(self, start, timeout):
+        """start件目以降のセグメントを返す（まだない場合は追加か完了まで最大timeout秒待つ）"""
+        with self._cond:
+            if len(self.segments) <= start and not self.finished:
+                self._cond.wait(timeout)
+            return self.segments[start:], self.finished
+
+    def to_dict(self, include_text=True):
+        with self._cond:
+            data = {
+                "id": self.id, "file": self.file_name, "state": self.state,
+                "segments": len(self.segments), "error": self.error,
+                "created_at": self.created_at, "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+            if self.entry is not None:
+                data.update(output_files=self.entry.get("output_files") or {},
+                            metrics=self.entry.get("metrics"), cached=self.entry.get("cached"))
+                if include_text:
+                    data["text"] = self.entry.get("text", "")
+        return data
+
+
+class TranscriptionService:
+    """ジョブのキューと、モデルを読み込んだまま常駐するワーカースレッド
+
+    make_engine() は設定済みの TranscriptionEngine を返す関数（resident.ResidentWorkers を参照）。
+    """
+
+    def __init__(self, output_dir, make_engine, workers=1, max_queue=DEFAULT_MAX_QUEUE,
+                 on_status=None):
+        self.output_dir = os.path.abspath(output_dir)
+        self.upload_dir = os.path.join(self.output_dir, ".uploads")
+        self.workers = max(1, workers)
+        self.on_status = on_status
+        self._queue = queue.Queue(max_queue)
+        self._jobs = collections.OrderedDict()
+        self._jobs_lock = threading.Lock()
+        self._workers = ResidentWorkers(make_engine, self._take, self._process,
+                                        workers=self.workers, name="http-worker",
+                                        on_status=on_status)
+        self._started_at = None
+        self._counts = collections.Counter()
+        self._audio_seconds = 0.0
+        self._busy_seconds = 0.0
+        self._timer = StageTimer()
+        self._stats_lock = threading.Lock()
+
+    def _status(self, message):
+        if self.on_status:
+            self.on_status(message)
+
+    def submit(self, path, file_name=None, upload=False):
+        """ジョブを追加して返す（キューが満杯の場合は queue.Full を送出）"""
+        job = TranscriptionJob(path, file_name or os.path.basename(path), upload)
+        with self._jobs_lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._jobs_lock:
+                del self._jobs[job.id]
+            raise
+        with self._stats_lock:
+            self._counts[STATE_QUEUED] += 1
+        return job
+
+    def save_upload(self, file_name, stream, length):
+        """アップロードされた音声を保存し、そのパスを返す"""
+        # 同じ名前のアップロードと重ならないよう、依頼ごとのフォルダに元の名前で保存する
+        upload_dir = os.path.join(self.upload_dir, uuid.uuid4().hex)
+        os.makedirs(upload_dir)
+        safe_name = re.sub(r'[\\/:*?"<>|\x00-\x1f]', "_", os.path.basename(file_name)) or "audio"
+        path = os.path.join(upload_dir, safe_name)
+        remaining = length
+        with open(path, 'wb') as f:
+            while remaining > 0:
+                data = stream.read(min(remaining, 1 << 20))
+                if not data:
+                    break
+                f.write(data)
+                remaining -= len(data)
+        if remaining:
+            remove_upload(path)
+            raise ValueError("アップロードが途中で終了しました")
+        return path
+
+    def get_job(self, job_id):
+        with self._jobs_lock:
+            return self._jobs.get(job_id)
+
+    def _forget_old_jobs(self):
+        with self._jobs_lock:
+            finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+            for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+                del self._jobs[job_id]
+
+    def health(self):
+        ready, failed, _ = self._workers.counts()
+        if ready:
+            status = "ok"
+        elif failed >= self.workers:
+            # 全てのワーカーがモデルを読み込めなかった
+            status = "error"
+        else:
+            status = "starting"
+        return {"status": status, "ready_workers": ready, "workers": self.workers}
+
+    def metrics(self):
+        """キューの深さ・処理中の数・処理速度などの統計情報"""
+        uptime = time.time() - self._started_at if self._started_at else 0.0
+        ready, _, busy = self._workers.counts()
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "workers": self.workers,
+                "ready_workers": ready,
+                "busy_workers": busy,
+                "jobs_submitted": self._counts[STATE_QUEUED],
+                "jobs_done": self._counts[STATE_DONE],
+                "jobs_failed": self._counts[STATE_FAILED],
+                "audio_seconds": self._audio_seconds,
+                # 処理中の時間あたりに処理した音声の長さ（ワーカー1つあたりの実時間の倍率）
+                "audio_seconds_per_busy_second": (self._audio_seconds / self._busy_seconds
+                                                  if self._busy_seconds else None),
+                "files_per_hour": self._counts[STATE_DONE] * 3600 / uptime if uptime else 0.0,
+                "stages": self._timer.as_dict(),
+                "uptime_seconds": uptime,
+                "peak_rss_bytes": peak_rss_bytes(),
+            }
+
+    def _take(self, timeout):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _process(self, engine, job):
+        job.set_state(STATE_RUNNING)
+        engine.on_segments = lambda index, file_path, segments: job.add_segments(segments)
+        # エンジンはワーカーごとに別のため、出力先をジョブごとのフォルダに切り替えてよい
+        engine.output_dir = os.path.join(self.output_dir, job.id)
+        start = time.perf_counter()
+        try:
+            entry = engine.run([job.path])[0]
+            error = entry["error"] or (None if entry["saved"] else "保存失敗")
+        except Exception as e:
+            entry = None
+            error = str(e)
+        finally:
+            engine.on_segments = None
+            engine.output_dir = self.output_dir
+            if job.upload:
+                remove_upload(job.path)
+        busy_seconds = time.perf_counter() - start
+        metrics = (entry or {}).get("metrics") or {}
+        with self._stats_lock:
+            self._busy_seconds += busy_seconds
+            self._audio_seconds += metrics.get("audio_seconds") or 0.0
+            self._counts[STATE_FAILED if error else STATE_DONE] += 1
+            self._timer.merge(metrics.get("stages", {}))
+        if error:
+            job.set_state(STATE_FAILED, entry, error)
+            self._status(f"処理に失敗しました: {job.file_name}: {error}")
+        else:
+            job.set_state(STATE_DONE, entry)
+            self._status(f"保存しました: {entry['output_file']}")
+        self._forget_old_jobs()
+
+    def start(self):
+        """ワーカースレッドを起動する"""
+        self._started_at = time.time()
+        self._workers.start()
+
+    def stop(self, timeout=None):
+        """新しいジョブの取り出しを止め、処理中のジョブの完了を待つ"""
+        self._workers.request_stop()
+        self._workers.join(timeout)
+        shutil.rmtree(self.upload_dir, ignore_errors=True)
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    server_version = "SimpleTranscriber"
+    service = None
+    quiet = False
+
+    def log_message(self, format, *args):
+        # アクセスログ（標準エラー出力）は quiet の場合は出さない
+        if not self.quiet:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message):
+        self._send_json(status, {"error": message})
+
+    def _route(self):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        return parts, parse_qs(url.query)
+
+    def do_GET(self):
+        parts, query = self._route()
+        if parts == ["health"]:
+            return self._send_json(200, self.service.health())
+        if parts == ["metrics"]:
+            return self._send_json(200, self.service.metrics())
+        if len(parts) in (2, 3) and parts[0] == "jobs":
+            job = self.service.get_job(parts[1])
+            if job is None:
+                return self._send_error(404, "ジョブが見つかりません")
+            if len(parts) == 2:
+                return self._send_json(200, job.to_dict())
+            if parts[2] == "segments":
+                try:
+                    start = int(query.get("from", ["0"])[0])
+                except ValueError:
+                    return self._send_error(400, "from には整数を指定してください")
+                segments, finished = job.wait_segments(start, 0)
+                return self._send_json(200, {"state": job.state, "from": start,
+                                             "segments": segments, "finished": finished})
+            if parts[2] == "stream":
+                return self._stream(job)
+        self._send_error(404, "見つかりません")
+
+    def _stream(self, job):
+        """確定したセグメントを1行1件のJSONで送り、最後にジョブの状態を送る"""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        # 長さを決めずに送り、送り終えたら接続を閉じる
+        self.send_header("Connection", "close")
+        self.end_headers()
+        sent = 0
+        try:
+            while True:
+                segments, finished = job.wait_segments(sent, _STREAM_WAIT_SECONDS)
+                for segment in segments:
+                    self.wfile.write(json.dumps(segment, ensure_ascii=False).encode("utf-8") + b"\n")
+                sent += len(segments)
+                self.wfile.flush()
+                if finished and not segments:
+                    status = job.to_dict(include_text=False)
+                    self.wfile.write(json.dumps({"job": status}, ensure_ascii=False).encode("utf-8") + b"\n")
+                    break
+        except (BrokenPipeError, ConnectionResetError):
+            # クライアントが途中で切断した
+            pass
+        self.close_connection = True
+
+    def do_POST(self):
+        parts, query = self._route()
+        if parts != ["jobs"]:
+            return self._send_error(404, "見つかりません")
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            return self._send_error(411, "Content-Length を指定してください")
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip()
+        upload = False
+        try:
+            if content_type == "application/json":
+                request = json.loads(self.rfile.read(length) or b"{}")
+                path = request.get("path") if isinstance(request, dict) else None
+                if not path:
+                    return self._send_error(400, "path を指定してください")
+                path = os.path.abspath(path)
+                if not os.path.isfile(path):
+                    return self._send_error(400, f"ファイルが見つかりません: {path}")
+                file_name = os.path.basename(path)
+                if not file_name.lower().endswith(AUDIO_EXTENSIONS):
+                    return self._send_error(400, f"対応していないファイル形式です: {file_name}")
+            else:
+                file_name = query.get("filename", [""])[0] or self.headers.get("X-Filename", "")
+                if not file_name:
+                    return self._send_error(400, "filename にファイル名（拡張子付き）を指定してください")
+                file_name = os.path.basename(file_name)
+                # 対応していない形式や大きすぎるファイルは、本文を受け取る前に断る
+                if not file_name.lower().endswith(AUDIO_EXTENSIONS):
+                    return self._send_error(400, f"対応していないファイル形式です: {file_name}")
+                if length > MAX_UPLOAD_BYTES:
+                    return self._send_error(413, "ファイルが大きすぎます")
+                path = self.service.save_upload(file_name, self.rfile, length)
+                upload = True
+        except ValueError as e:
+            return self._send_error(400, str(e))
+        try:
+            job = self.service.submit(path, file_name, upload)
+        except queue.Full:
+            if upload:
+                remove_upload(path)
+            return self._send_error(503, "キューが満杯です。しばらくしてから再度送信してください")
+        self._send_json(202, dict(job.to_dict(), status_url=f"/jobs/{job.id}",
+                                  stream_url=f"/jobs/{job.id}/stream"))
+
+
+def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT, quiet=False, on_status=None):
+    """サービスを起動し、停止されるまでHTTPリクエストを処理する（Ctrl+Cで停止）"""
+    handler = type("RequestHandler", (_RequestHandler,), {"service": service, "quiet": quiet})
+    httpd = ThreadingHTTPServer((host, port), handler)
+    httpd.daemon_threads = True
+    service.start()
+    if on_status:
+        on_status(f"http://{host}:{httpd.server_address[1]}/ で待ち受けています"
+                  f"（ワーカー {service.workers}個、出力先: {service.output_dir}）")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        if on_status:
+            on_status("停止しています（処理中のジョブの完了を待ちます）...")
+    finally:
+        httpd.server_close()
+        service.stop()
@@ -0,0 +1,161 @@
+"""処理段階ごとの時間計測と実行ログ"""
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# 計測する処理段階
+STAGE_MODEL_LOAD = "model_load"
+STAGE_DECODE = "decode"
+STAGE_INFERENCE = "inference"
+STAGE_SAVE = "save"
+
+
+class StageTimer:
+    """処理段階ごとの所要時間（秒）と回数を累積する"""
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.counts = defaultdict(int)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds, count=1):
+        self.seconds[name] += seconds
+        self.counts[name] += count
+
+    def merge(self, timings):
+        """as_dict() の形式の計測結果（ワーカープロセスなど）を加算する"""
+        for name, item in timings.items():
+            self.add(name, item["seconds"], item["count"])
+
+    def as_dict(self):
+        return {name: {"seconds": self.seconds[name], "count": self.counts[name]}
+                for name in self.seconds}
+
+
+class NullTimer:
+    """計測しない場合に使う何もしないタイマー"""
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def add(self, name, seconds, count=1):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class ThroughputMeter:
+    """完了した処理量と経過時間から、残りの処理にかかる時間を推定する"""
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self._partial = {}  # 処理中の項目 -> 処理済みの量
+        self._start = None
+
+    def start(self):
+        """計測を開始する（2回目以降の呼び出しは無視する）"""
+        if self._start is None:
+            self._start = time.perf_counter()
+
+    def add(self, amount, key=None):
+        """完了した処理量を加える（key を指定した場合はその項目の途中経過を置き換える）"""
+        self.done += amount
+        if key is not None:
+            self._partial.pop(key, None)
+
+    def update(self, key, amount):
+        """処理中の項目の処理済みの量を更新する"""
+        self._partial[key] = amount
+
+    @property
+    def processed(self):
+        """完了した処理量と、処理中の項目の途中経過の合計"""
+        return self.done + sum(self._partial.values())
+
+    def eta_seconds(self):
+        """残り時間の推定値（秒）。まだ推定できない場合はNone"""
+        processed = self.processed
+        if self._start is None or processed <= 0:
+            return None
+        elapsed = time.perf_counter() - self._start
+        return max(0.0, self.total - processed) * elapsed / processed
+
+
+def current_rss_bytes():
+    """プロセスの現在の常駐メモリ（バイト）を返す（取得できない場合はNone）"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        return None
+
+
+def rss_growth_bytes(before):
+    """current_rss_bytes() で取得した before からの常駐メモリの増加量（取得できない場合はNone）"""
+    after = current_rss_bytes()
+    if before is None or after is None:
+        return None
+    return after - before
+
+
+def peak_rss_bytes(include_children=False):
+    """プロセスの最大常駐メモリ（バイト）を返す（取得できない場合はNone）
+
+    プロセスの起動時からの最大値のため、ファイルごとの使用量ではない。
+    """
+    try:
+        import resource
+    except ImportError:
+        # Windowsではpsutilがあればそれを使う
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset
+        except (ImportError, AttributeError):
+            return None
+    # Linuxではキロバイト、macOSではバイト単位
+    scale = 1 if sys.platform == "darwin" else 1024
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    if include_children:
+        peak = max(peak, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale)
+    return peak
+
+
+class RunLog:
+    """1回の実行の計測結果をJSON Lines形式（1行1イベント）で記録する"""
+
+    def __init__(self, path):
+        self.path = path
+
+    @classmethod
+    def create(cls, log_dir=None):
+        """ログフォルダに実行日時の名前で新しいログを作成する"""
+        if log_dir is None:
+            from settings import get_app_dir
+            log_dir = get_app_dir("logs")
+        os.makedirs(log_dir, exist_ok=True)
+        name = time.strftime("run-%Y%m%d-%H%M%S") + f"-{os.getpid()}.jsonl"
+        return cls(os.path.join(log_dir, name))
+
+    def write(self, event, **fields):
+        """イベントを1行追記する（失敗時は OSError を送出）"""
+        record = dict(event=event, time=time.time(), **fields)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
@@ -0,0 +1,133 @@
+"""中断したバッチ処理を再開するためのジョブマニフェスト
+
+出力先フォルダにファイルごとの状態（未処理・完了・失敗）、出力先、
+使用した設定、長いファイルの途中までの結果（チェックポイント）を保存する。
+入力ファイルのサイズと更新日時も記録し、内容が変わったファイルは最初から処理し直す。
+"""
+import json
+import os
+import time
+
+from job_queue import file_signature
+
+MANIFEST_NAME = ".simple_transcriber_job.json"
+
+STATE_PENDING = "pending"
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+
+
+def get_manifest_path(output_dir):
+    return os.path.join(output_dir, MANIFEST_NAME)
+
+
+def _signature(file_path):
+    try:
+        return file_signature(file_path)
+    except OSError:
+        return None
+
+
+class JobManifest:
+    """ファイルごとの処理状態を保持し、変更のたびにディスクへ書き出す"""
+
+    def __init__(self, path, settings, files=None):
+        self.path = path
+        self.settings = settings
+        self.files = files or {}
+
+    @classmethod
+    def load_or_create(cls, output_dir, file_paths, settings):
+        """既存のマニフェストを読み込む（設定が異なる・存在しない場合は新規作成）
+
+        今回処理しないファイルの記録は破棄し、前回から内容が変わったファイルは
+        チェックポイントも含めて未処理に戻す。
+        """
+        path = get_manifest_path(output_dir)
+        manifest = cls(path, settings)
+        previous = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("settings") == settings:
+                previous = data.get("files", {})
+        except (OSError, ValueError):
+            pass
+        for file_path in file_paths:
+            signature = _signature(file_path)
+            entry = previous.get(file_path)
+            if entry is None or signature is None or entry.get("signature") != signature:
+                entry = {"state": STATE_PENDING, "signature": signature}
+            manifest.files[file_path] = entry
+        return manifest
+
+    def has_progress(self, file_paths):
+        """指定されたファイルのうち、完了済みまたは途中まで処理済みのものがあるか"""
+        return any(self.is_done(path) or self.get_checkpoint(path) for path in file_paths)
+
+    def reset(self, file_paths):
+        """指定されたファイルの状態を未処理に戻す"""
+        for file_path in file_paths:
+            self.files[file_path] = {"state": STATE_PENDING, "signature": _signature(file_path)}
+        self.save()
+
+    def is_done(self, file_path):
+        """完了済みで、出力ファイルが残っているか"""
+        entry = self.files.get(file_path, {})
+        return (entry.get("state") == STATE_DONE
+                and bool(entry.get("output_file"))
+                and os.path.exists(entry["output_file"]))
+
+    def get_output_file(self, file_path):
+        return self.files.get(file_path, {}).get("output_file")
+
+    def get_checkpoint(self, file_path):
+        """途中から再開するための状態（ない場合はNone）"""
+        entry = self.files.get(file_path, {})
+        if entry.get("state") == STATE_DONE:
+            return None
+        return entry.get("checkpoint")
+
+    def checkpoint(self, file_path, state):
+        """窓の区切りまでの処理状態を記録する（stateのsegmentsは新たに確定した分のみ）"""
+        entry = self.files.setdefault(file_path, {"state": STATE_PENDING,
+                                                  "signature": _signature(file_path)})
+        previous = entry.get("checkpoint") or {"segments": []}
+        entry["checkpoint"] = {
+            "offset": state["offset"],
+            "boundary": state["boundary"],
+            "language": state.get("language"),
+            "segments": previous["segments"] + list(state["segments"]),
+        }
+        self.save()
+
+    def mark_done(self, file_path, output_file):
+        # 処理を始めたときの入力ファイルの内容と対応付けておく
+        signature = self.files.get(file_path, {}).get("signature") or _signature(file_path)
+        self.files[file_path] = {"state": STATE_DONE, "output_file": output_file,
+                                 "finished_at": time.time(), "signature": signature}
+        self.save()
+
+    def mark_failed(self, file_path, error):
+        # 失敗した場合もチェックポイントは残し、次回はその続きから処理する
+        entry = self.files.setdefault(file_path, {"signature": _signature(file_path)})
+        entry.update(state=STATE_FAILED, error=error)
+        self.save()
+
+    def all_done(self):
+        return all(entry.get("state") == STATE_DONE for entry in self.files.values())
+
+    def save(self):
+        """一時ファイルに書き込んでから置き換え、書き込み中の中断で壊れないようにする"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"settings": self.settings, "files": self.files}, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+    def remove(self):
+        """全てのファイルが完了した場合などにマニフェストを削除する"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,163 @@
+"""監視フォルダ用の永続ジョブキュー（SQLite）
+
+監視フォルダに追加されたファイルを1件ずつジョブとして記録し、ワーカーが
+古いものから順に取り出して処理する。プロセスが終了・クラッシュしても
+未処理のジョブは次回の起動時に続きから処理される。
+"""
+import os
+import sqlite3
+import threading
+import time
+
+QUEUE_NAME = ".simple_transcriber_queue.sqlite3"
+
+STATE_PENDING = "pending"
+STATE_RUNNING = "running"
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+
+# 失敗したジョブを再試行する回数の上限
+MAX_ATTEMPTS = 3
+# 処理速度の集計に使う直近の期間（秒）
+THROUGHPUT_WINDOW_SECONDS = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL,
+    signature TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    audio_seconds REAL,
+    output_file TEXT,
+    error TEXT,
+    UNIQUE (path, signature)
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id);
+"""
+
+
+def get_queue_path(output_dir):
+    return os.path.join(output_dir, QUEUE_NAME)
+
+
+def file_signature(file_path):
+    """内容が変わったことを検出するための、サイズと更新日時からなる値"""
+    stat = os.stat(file_path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class JobQueue:
+    """ファイル単位の文字起こしジョブのキュー（スレッドセーフ）"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        # 新しいジョブが追加されたことを待機中のワーカーに知らせる
+        self._added = threading.Condition(self._lock)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(_SCHEMA)
+
+    @classmethod
+    def for_output_dir(cls, output_dir):
+        return cls(get_queue_path(output_dir))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def enqueue(self, file_path, signature):
+        """ジョブを追加する（同じ内容のファイルが既にあれば追加せずFalseを返す）"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (path, signature, state, enqueued_at) VALUES (?, ?, ?, ?)",
+                (file_path, signature, STATE_PENDING, time.time()))
+            added = cursor.rowcount > 0
+            if added:
+                self._added.notify()
+            return added
+
+    def recover(self):
+        """前回の終了時に処理中だったジョブを未処理に戻し、その件数を返す"""
+        with self._lock:
+            cursor = self._conn.execute("UPDATE jobs SET state = ?, started_at = NULL WHERE state = ?",
+                                        (STATE_PENDING, STATE_RUNNING))
+            return cursor.rowcount
+
+    def claim(self, timeout=None):
+        """最も古い未処理のジョブを処理中にして返す（timeout秒待ってもなければNone）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while True:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE state = ? ORDER BY id LIMIT 1",
+                    (STATE_PENDING,)).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET state = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                        (STATE_RUNNING, time.time(), row["id"]))
+                    return dict(row, attempts=row["attempts"] + 1)
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._added.wait(remaining)
+
+    def wake_all(self):
+        """待機中のワーカーを全て起こす（終了時など）"""
+        with self._lock:
+            self._added.notify_all()
+
+    def complete(self, job_id, output_file, audio_seconds=None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, finished_at = ?, output_file = ?, audio_seconds = ?, "
+                "error = NULL WHERE id = ?",
+                (STATE_DONE, time.time(), output_file, audio_seconds, job_id))
+
+    def fail(self, job_id, error):
+        """ジョブを失敗として記録する（再試行の上限に達していなければ未処理に戻す）
+
+        戻り値は再試行するかどうか。
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            retry = row is not None and row["attempts"] < MAX_ATTEMPTS
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, finished_at = ?, error = ? WHERE id = ?",
+                (STATE_PENDING if retry else STATE_FAILED, time.time(), error, job_id))
+            if retry:
+                self._added.notify()
+            return retry
+
+    def stats(self):
+        """キューの状態ごとの件数と、直近の処理速度を返す"""
+        now = time.time()
+        with self._lock:
+            counts = {state: 0 for state in (STATE_PENDING, STATE_RUNNING, STATE_DONE, STATE_FAILED)}
+            for row in self._conn.execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state"):
+                counts[row["state"]] = row["n"]
+            recent = self._conn.execute(
+                "SELECT COUNT(*) AS files, COALESCE(SUM(audio_seconds), 0) AS audio_seconds, "
+                "COALESCE(SUM(finished_at - started_at), 0) AS busy_seconds "
+                "FROM jobs WHERE state = ? AND finished_at >= ?",
+                (STATE_DONE, now - THROUGHPUT_WINDOW_SECONDS)).fetchone()
+            oldest = self._conn.execute(
+                "SELECT MIN(enqueued_at) AS t FROM jobs WHERE state = ?", (STATE_PENDING,)).fetchone()
+        return {
+            "queue_depth": counts[STATE_PENDING],
+            "counts": counts,
+            # 直近1時間に完了したファイル数と、その音声の合計時間
+            "recent_files": recent["files"],
+            "recent_audio_seconds": recent["audio_seconds"],
+            "files_per_hour": recent["files"] * 3600 / THROUGHPUT_WINDOW_SECONDS,
+            # 処理中の時間あたりに処理した音声の長さ（ワーカー1つあたりの実時間の倍率）
+            "audio_seconds_per_busy_second": (recent["audio_seconds"] / recent["busy_seconds"]
+                                              if recent["busy_seconds"] else None),
+            # 最も長く待っている未処理のジョブの待ち時間（秒）
+            "oldest_pending_seconds": now - oldest["t"] if oldest["t"] is not None else None,
+        }
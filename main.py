@@ -3,9 +3,27 @@ import sys
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import threading
+import multiprocessing
 import time
 import shutil
 
+from autotune import AUTO_MODEL, MODEL_NAMES, choose_settings, describe_plan, memory_warning
+from backends import DEFAULT_BACKEND, available_backends
+from engine import AUDIO_EXTENSIONS, TranscriptionEngine, format_duration, get_default_output_dir
+from exporters import OUTPUT_FORMATS
+from instrumentation import RunLog
+from job_manifest import JobManifest
+from model_cache import get_model_cache
+from preloader import ModulePreloader
+from settings import load_settings, save_settings
+from transcript_cache import TranscriptCache
+
+# 結果欄へ追記を反映する間隔（ミリ秒）
+RESULT_FLUSH_INTERVAL_MS = 200
+
+# 設定するとウィンドウの表示直後に終了する（benchmark.py --startup での起動時間の計測用）
+STARTUP_PROBE_ENV = "SIMPLE_TRANSCRIBER_STARTUP_PROBE"
+
 class WhisperTranscriberApp:
     def __init__(self, root):
         self.root = root
@@ -16,16 +34,32 @@ class WhisperTranscriberApp:
         # アセットディレクトリの設定
         self._setup_whisper_assets()
         
+        # 前回の設定を読み込む
+        self.settings = load_settings()
+        
         # 変数の初期化
         self.file_paths = []  # 複数ファイルのパスを保持するリスト
-        self.model = tk.StringVar(value="tiny")
-        self.language = tk.StringVar(value="ja")
+        self.model = tk.StringVar(value=self.settings["model"])
+        self.language = tk.StringVar(value=self.settings["language"])
+        # インストールされていないバックエンドが保存されていた場合は標準のものに戻す
+        self.available_backends = available_backends() or [DEFAULT_BACKEND]
+        backend = self.settings["backend"]
+        self.backend = tk.StringVar(
+            value=backend if backend in self.available_backends else DEFAULT_BACKEND)
+        self.workers = tk.IntVar(value=1)
+        self.torch_threads = tk.IntVar(value=0)
+        self.use_cache = tk.BooleanVar(value=self.settings["use_transcript_cache"])
+        self.use_vad = tk.BooleanVar(value=self.settings["use_vad"])
+        self.output_formats = {name: tk.BooleanVar(value=name in self.settings["output_formats"])
+                               for name in OUTPUT_FORMATS}
+        self.word_timestamps = tk.BooleanVar(value=self.settings["word_timestamps"])
         self.progress = tk.DoubleVar()
         self.status = tk.StringVar(value="ファイルを選択してください")
+        self.engine_status = tk.StringVar(value="音声認識エンジンを読み込み中...")
         self.current_file_index = 0  # 現在処理中のファイルインデックス
         
         # 出力先の設定
-        self.output_dir = self._get_default_output_dir()
+        self.output_dir = get_default_output_dir()
         
         # GUIの作成
         self._create_widgets()
@@ -33,6 +67,35 @@ class WhisperTranscriberApp:
         # プロセスの状態
         self.is_processing = False
         self.process_thread = None
+        
+        # 結果欄への追記待ちのテキスト（処理スレッドから追加し、GUIスレッドでまとめて反映）
+        self._pending_result = []
+        self._result_lock = threading.Lock()
+        self._result_flush_scheduled = False
+        self._result_headers = set()
+        self._last_result_index = None
+        
+        # 読み込み済みモデルのキャッシュ（実行間・モデル切り替え間で共有）
+        self.model_cache = get_model_cache()
+        
+        # whisper/torchはウィンドウを表示してからバックグラウンドで読み込む
+        self.preloader = ModulePreloader()
+        self.root.after_idle(self._start_preload)
+    
+    def _start_preload(self):
+        """whisper/torchの読み込みを開始し、完了したらモデルの事前読み込みに進む"""
+        self.engine_status.set("音声認識エンジンを読み込み中...")
+        
+        def on_done(error):
+            if error is not None:
+                message = "音声認識エンジン: 読み込み失敗"
+            else:
+                message = f"音声認識エンジン: 準備完了（{self.preloader.seconds:.1f}秒）"
+                if self.settings["warm_up_on_start"]:
+                    self.root.after(0, self._warm_up_model)
+            self.root.after(0, lambda: self.engine_status.set(message))
+        
+        self.preloader.start(on_done)
 
     def _setup_whisper_assets(self):
         """Whisperのアセットディレクトリを設定"""
@@ -86,9 +149,10 @@ class WhisperTranscriberApp:
         # モデル選択
         ttk.Label(options_frame, text="モデル:").grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
         model_combo = ttk.Combobox(options_frame, textvariable=self.model, 
-                                  values=["tiny", "base", "small", "medium", "large"], 
+                                  values=list(MODEL_NAMES) + [AUTO_MODEL], 
                                   state="readonly", width=10)
         model_combo.grid(row=0, column=1, padx=5, pady=5, sticky=tk.W)
+        model_combo.bind("<<ComboboxSelected>>", lambda event: self._warm_up_model())
         
         # 言語選択
         ttk.Label(options_frame, text="言語:").grid(row=0, column=2, padx=5, pady=5, sticky=tk.W)
@@ -97,9 +161,50 @@ class WhisperTranscriberApp:
                                  state="readonly", width=10)
         lang_combo.grid(row=0, column=3, padx=5, pady=5, sticky=tk.W)
         
+        # 推論バックエンド選択
+        ttk.Label(options_frame, text="バックエンド:").grid(row=0, column=4, padx=5, pady=5, sticky=tk.W)
+        backend_combo = ttk.Combobox(options_frame, textvariable=self.backend,
+                                     values=self.available_backends,
+                                     state="readonly", width=14)
+        backend_combo.grid(row=0, column=5, padx=5, pady=5, sticky=tk.W)
+        backend_combo.bind("<<ComboboxSelected>>", lambda event: self._warm_up_model())
+        
         # 説明
-        models_info = ttk.Label(options_frame, text="tiny: 最速・低精度, base: 速い, small: バランス, medium: 高精度, large: 最高精度・最低速")
-        models_info.grid(row=1, column=0, columnspan=4, padx=5, pady=2, sticky=tk.W)
+        models_info = ttk.Label(options_frame, text="tiny: 最速・低精度, base: 速い, small: バランス, medium: 高精度, large: 最高精度・最低速, "
+                                                    "auto: 空きメモリと処理速度から自動選択")
+        models_info.grid(row=1, column=0, columnspan=6, padx=5, pady=2, sticky=tk.W)
+        
+        # 並列処理の設定
+        ttk.Label(options_frame, text="並列数:").grid(row=2, column=0, padx=5, pady=5, sticky=tk.W)
+        ttk.Spinbox(options_frame, textvariable=self.workers, from_=1, to=os.cpu_count() or 1,
+                    state="readonly", width=8).grid(row=2, column=1, padx=5, pady=5, sticky=tk.W)
+        ttk.Label(options_frame, text="スレッド数:").grid(row=2, column=2, padx=5, pady=5, sticky=tk.W)
+        ttk.Spinbox(options_frame, textvariable=self.torch_threads, from_=0, to=os.cpu_count() or 1,
+                    state="readonly", width=8).grid(row=2, column=3, padx=5, pady=5, sticky=tk.W)
+        ttk.Label(options_frame, text="並列数: 同時に処理するファイル数（ファイルごとにモデルを読み込みます）, スレッド数: 0で自動").grid(
+            row=3, column=0, columnspan=4, padx=5, pady=2, sticky=tk.W)
+        
+        # 文字起こし結果のキャッシュ
+        ttk.Checkbutton(options_frame, text="同じ音声の結果を再利用する（キャッシュ）",
+                        variable=self.use_cache).grid(row=4, column=0, columnspan=3, padx=5, pady=5, sticky=tk.W)
+        ttk.Button(options_frame, text="キャッシュを削除", command=self._clear_cache).grid(
+            row=4, column=3, padx=5, pady=5, sticky=tk.W)
+        
+        # 無音区間の除去
+        ttk.Checkbutton(options_frame, text="無音区間をスキップする（講義・会議の録音向け）",
+                        variable=self.use_vad).grid(row=5, column=0, columnspan=4, padx=5, pady=5, sticky=tk.W)
+        ttk.Label(options_frame, text="バックエンド: whisper-int8 はCPUで高速・省メモリ（small/medium向け）, "
+                                      "faster-whisper はインストールされている場合のみ選択可").grid(
+            row=6, column=0, columnspan=6, padx=5, pady=2, sticky=tk.W)
+        
+        # 保存する形式
+        ttk.Label(options_frame, text="出力形式:").grid(row=7, column=0, padx=5, pady=5, sticky=tk.W)
+        formats_frame = ttk.Frame(options_frame)
+        formats_frame.grid(row=7, column=1, columnspan=5, padx=5, pady=5, sticky=tk.W)
+        for name in OUTPUT_FORMATS:
+            ttk.Checkbutton(formats_frame, text=name, variable=self.output_formats[name]).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Checkbutton(formats_frame, text="単語ごとの時刻（JSON、処理が遅くなります）",
+                        variable=self.word_timestamps).pack(side=tk.LEFT, padx=(10, 0))
         
         # 出力先設定
         output_frame = ttk.LabelFrame(main_frame, text="出力先", padding=5)
@@ -128,7 +233,8 @@ class WhisperTranscriberApp:
         # ステータス
         status_frame = ttk.Frame(main_frame)
         status_frame.pack(fill=tk.X, padx=5, pady=5)
-        ttk.Label(status_frame, textvariable=self.status).pack(anchor=tk.W)
+        ttk.Label(status_frame, textvariable=self.engine_status).pack(side=tk.RIGHT)
+        ttk.Label(status_frame, textvariable=self.status).pack(side=tk.LEFT, anchor=tk.W)
         
         # 結果テキストエリア
         result_frame = ttk.LabelFrame(main_frame, text="文字起こし結果", padding=5)
@@ -141,12 +247,48 @@ class WhisperTranscriberApp:
         scrollbar.pack(fill=tk.Y, side=tk.RIGHT)
         self.result_text.config(yscrollcommand=scrollbar.set)
     
+    def _warm_up_model(self):
+        """選択中のモデルをバックグラウンドで読み込んでおく"""
+        if not self.settings["warm_up_on_start"]:
+            return
+        model_name = self.model.get()
+        backend = self.backend.get()
+        if model_name == AUTO_MODEL:
+            # 自動選択の場合は文字起こしの開始時にモデルが決まる
+            return
+        # メモリ不足になりそうなモデルは、開始時に確認するまで読み込まない
+        warning = memory_warning(model_name, backend)
+        if warning:
+            print(f"モデルの事前読み込みを省略しました: {warning}")
+            return
+        
+        def on_done(error):
+            # 読み込みに失敗しても、文字起こし開始時に改めて読み込みを試みる
+            if error is not None:
+                print(f"モデル {model_name}（{backend}）の事前読み込みに失敗しました: {str(error)}")
+        
+        self.model_cache.warm_up(model_name, on_done=on_done, backend=backend)
+    
+    def _get_transcript_cache(self):
+        """文字起こし結果のキャッシュを返す"""
+        return TranscriptCache(max_bytes=self.settings["transcript_cache_max_mb"] * 1024 ** 2)
+    
+    def _clear_cache(self):
+        """文字起こし結果のキャッシュを削除"""
+        if not messagebox.askyesno("確認", "保存済みの文字起こし結果のキャッシュを削除しますか？"):
+            return
+        try:
+            removed = self._get_transcript_cache().clear()
+            messagebox.showinfo("情報", f"キャッシュを{removed}件削除しました")
+        except Exception as e:
+            messagebox.showerror("エラー", f"キャッシュの削除中にエラーが発生しました: {str(e)}")
+    
     def _browse_files(self):
         """複数のファイルを選択するダイアログを表示"""
         file_paths = filedialog.askopenfilenames(
             title="音声/動画ファイルを選択",
             filetypes=[
-                ("音声/動画ファイル", "*.mp3 *.wav *.mp4 *.avi *.mov *.ogg *.flac *.m4a"),
+                ("音声/動画ファイル", " ".join(f"*{ext}" for ext in AUDIO_EXTENSIONS)),
                 ("すべてのファイル", "*.*")
             ]
         )
@@ -185,119 +327,166 @@ class WhisperTranscriberApp:
             messagebox.showerror("エラー", f"以下のファイルが見つかりません:\n{missing_files_str}")
             return
         
-        # 依存関係の確認
-        try:
-            import whisper
-        except ImportError:
-            # 依存関係のインストール処理
-            self._update_status("必要なパッケージをインストールしています...", 5)
-            
+        # 依存関係の確認（importはバックグラウンドで行い、ここでは結果だけを見る）
+        # 読み込み中の場合はそのまま開始し、処理スレッドで読み込みの完了を待つ
+        if self.preloader.is_done() and self.preloader.error is not None:
+            error = self.preloader.error
+            # パッケージをインストールした後に再度開始できるよう、読み込みをやり直す
+            self._start_preload()
+            self._show_preload_error(error)
+            return
+        
+        output_formats = [name for name in OUTPUT_FORMATS if self.output_formats[name].get()]
+        if not output_formats:
+            messagebox.showerror("エラー", "出力形式を1つ以上選択してください。")
+            return
+        
+        # 大きいモデルを選んだ場合に、メモリ不足で強制終了される前に警告する
+        # （「いいえ」の場合は設定を保存せず、次回起動時に読み込まないようにする）
+        if self.model.get() != AUTO_MODEL:
+            warning = memory_warning(self.model.get(), self.backend.get(), self.workers.get())
+            if warning and not messagebox.askyesno("確認", f"{warning}\n\nこのまま開始しますか？"):
+                return
+        
+        # 次回起動時のために設定を保存
+        self.settings.update(model=self.model.get(), language=self.language.get(),
+                             backend=self.backend.get(),
+                             use_transcript_cache=self.use_cache.get(),
+                             use_vad=self.use_vad.get(),
+                             output_formats=output_formats,
+                             word_timestamps=self.word_timestamps.get())
+        save_settings(self.settings)
+        
+        if self.model.get() == AUTO_MODEL:
+            self._start_auto_tuning()
+            return
+        self._begin_transcription(self._create_engine())
+    
+    def _start_auto_tuning(self):
+        """モデルと並列数を自動選択してから処理を開始する（速度の計測は別スレッドで行う）"""
+        self.is_processing = True
+        self.progress.set(0)
+        self.status.set("モデルを自動選択しています...")
+        file_paths = list(self.file_paths)
+        backend = self.backend.get()
+        language = None if self.language.get() == "auto" else self.language.get()
+        
+        def run():
             try:
-                import pip
-                pip.main(['install', 'openai-whisper'])
-                self._update_status("パッケージのインストールが完了しました", 10)
+                plan = choose_settings(file_paths, target_ratio=self.settings["auto_target_ratio"],
+                                       backend=backend, language=language,
+                                       on_status=lambda message: self._update_status(message, 5))
             except Exception as e:
-                messagebox.showerror("エラー", f"パッケージのインストールに失敗しました: {str(e)}")
-                self._update_status("エラーが発生しました", 0)
+                self.is_processing = False
+                self._update_status(f"モデルの自動選択に失敗しました: {str(e)}", 0)
+                messagebox.showerror("エラー", f"モデルの自動選択に失敗しました: {str(e)}")
                 return
+            self.root.after(0, lambda: self._apply_plan(plan))
+        
+        threading.Thread(target=run, daemon=True).start()
+    
+    def _apply_plan(self, plan):
+        """自動選択の結果で処理を開始する"""
+        self.is_processing = False
+        print(describe_plan(plan))
+        self.status.set(describe_plan(plan))
+        if plan["warning"] and not messagebox.askyesno("確認", f"{plan['warning']}\n\nこのまま開始しますか？"):
+            return
+        self.workers.set(plan["workers"])
+        self.torch_threads.set(plan["torch_threads"])
+        self._begin_transcription(self._create_engine(model_name=plan["model"]))
+    
+    def _begin_transcription(self, engine):
+        """ジョブマニフェストを確認し、処理スレッドを開始する"""
+        # 前回中断した処理があれば、続きから再開するか確認
+        engine.manifest = JobManifest.load_or_create(self.output_dir, self.file_paths,
+                                                     engine.job_settings())
+        if engine.manifest.has_progress(self.file_paths):
+            if not messagebox.askyesno("確認", "前回中断した処理が見つかりました。続きから再開しますか？\n"
+                                              "（「いいえ」を選ぶと最初から処理します）"):
+                engine.manifest.reset(self.file_paths)
         
         # 処理開始
+        self.result_text.delete(1.0, tk.END)
         self.is_processing = True
         self.progress.set(0)
         self.status.set("処理を開始します...")
         
         # 別スレッドで処理を実行
-        self.process_thread = threading.Thread(target=self._run_transcription)
+        self.process_thread = threading.Thread(target=self._run_transcription, args=(engine,))
         self.process_thread.daemon = True
         self.process_thread.start()
     
-    def _run_transcription(self):
+    def _create_engine(self, **overrides):
+        """現在の設定から文字起こしエンジンを作成（overrides で個別の設定を変更）"""
+        options = dict(
+            model_name=self.model.get(),
+            backend=self.backend.get(),
+            language=self.language.get(),
+            output_dir=self.output_dir,
+            workers=self.workers.get(),
+            torch_threads=self.torch_threads.get(),
+            vad=self.use_vad.get(),
+            batch_size=self.settings["batch_size"],
+            prefetch=self.settings["prefetch_files"],
+            output_formats=[name for name in OUTPUT_FORMATS if self.output_formats[name].get()],
+            word_timestamps=self.word_timestamps.get(),
+            model_cache=self.model_cache,
+            transcript_cache=self._get_transcript_cache() if self.use_cache.get() else None,
+            run_log=self._create_run_log(),
+            on_status=self._update_status,
+            on_error=lambda message: messagebox.showerror("エラー", message),
+            on_segments=self._on_result_segments,
+            on_file_done=self._on_result_file_done,
+        )
+        options.update(overrides)
+        return TranscriptionEngine(**options)
+    
+    def _create_run_log(self):
+        """計測結果の実行ログを作成（無効な場合や作成できない場合はNone）"""
+        if not self.settings.get("write_run_log"):
+            return None
+        try:
+            return RunLog.create()
+        except OSError as e:
+            print(f"実行ログを作成できません: {str(e)}")
+            return None
+    
+    def _show_preload_error(self, error):
+        """音声認識エンジンを読み込めなかったことと、その対処方法を表示する"""
+        messagebox.showerror("エラー", f"音声認識エンジン（openai-whisper）を読み込めません: {str(error)}\n\n"
+                                      "次のコマンドでインストールしてから、もう一度お試しください:\n"
+                                      "pip install -r requirements.txt")
+
+    def _run_transcription(self, engine):
         try:
-            # 初期設定
             self.current_file_index = 0
-            total_files = len(self.file_paths)
-            all_results = []
+            self._result_headers = set()
+            self._last_result_index = None
             
-            # モデルの準備
-            self._update_status("モデルを準備中...", 10)
+            # 起動時に始めた音声認識エンジンの読み込みが終わるまで待つ
+            if not self.preloader.is_done():
+                self._update_status("音声認識エンジンを読み込み中...", 5)
+                self.preloader.wait()
+            if self.preloader.error is not None:
+                error = self.preloader.error
+                self._update_status(f"音声認識エンジンを読み込めません: {str(error)}", 0)
+                self._show_preload_error(error)
+                return
             
-            # OpenAI Whisperのインポート
-            try:
-                # Whisperパッケージのロードを試行
-                import whisper
-                
-                # モデルのロード
-                model_name = self.model.get()
-                language = self.language.get()
-                
-                # 言語が自動検出の場合は None を指定
-                if language == "auto":
-                    language = None
-                
-                # モデルを直接指定してロードする前に、正しいロード方法を試す
+            # モデルの準備（並列処理の場合は各ワーカーが読み込む）
+            if engine.workers == 1 or len(self.file_paths) == 1:
+                self._update_status("モデルを準備中...", 10)
                 try:
                     # モデルの読み込み（初回は自動ダウンロード）
-                    model = whisper.load_model(model_name)
+                    engine.load_model()
                 except Exception as model_error:
                     self._update_status(f"モデルの読み込みに失敗しました: {str(model_error)}", 0)
                     messagebox.showerror("エラー", f"モデルの読み込みに失敗しました: {str(model_error)}")
                     return
-                
-                # 文字起こし結果のテキスト
-                combined_text = ""
-                
-                # 各ファイルを順番に処理
-                for i, file_path in enumerate(self.file_paths):
-                    self.current_file_index = i
-                    file_name = os.path.basename(file_path)
-                    
-                    # ファイルごとの進捗の計算
-                    # 全体の10%をモデルの準備に使用し、残りの90%をファイル処理に均等に分配
-                    file_progress_base = 10 + (i / total_files) * 90
-                    file_progress_range = 90 / total_files
-                    
-                    # ファイル処理開始
-                    self._update_status(f"ファイル {i+1}/{total_files} を処理中: {file_name}", 
-                                      file_progress_base)
-                    
-                    # 実際の処理実行
-                    try:
-                        result = model.transcribe(file_path, language=language)
-                        
-                        # 結果をリストに追加
-                        all_results.append({
-                            "file": file_name,
-                            "text": result["text"]
-                        })
-                        
-                        # 自動保存
-                        save_success = self._save_file_result(file_name, result["text"])
-                        if save_success:
-                            save_status = "（保存済み）"
-                        else:
-                            save_status = "（保存失敗）"
-                        
-                        # テキストを結合（ファイル名をヘッダーとして追加）
-                        combined_text += f"# {file_name} {save_status}\n\n{result['text']}\n\n"
-                        
-                        # ファイル処理完了
-                        self._update_status(f"ファイル {i+1}/{total_files} の処理が完了しました", 
-                                          file_progress_base + file_progress_range * 0.9)
-                    except Exception as file_error:
-                        self._update_status(f"ファイル {file_name} の処理中にエラーが発生しました: {str(file_error)}", 
-                                          file_progress_base)
-                        combined_text += f"# {file_name} （エラー）\n\n処理中にエラーが発生しました: {str(file_error)}\n\n"
-                
-                # 全ての結果を表示
-                self._update_result(combined_text)
-                
-                # 保存成功の数を計算
-                saved_count = sum(1 for r in all_results if r.get("saved", False))
-                self._update_status(f"{total_files}個のファイルの文字起こしが完了しました（{saved_count}個保存）", 100)
             
-            except Exception as whisper_error:
-                self._update_status(f"Whisperの初期化に失敗しました: {str(whisper_error)}", 0)
-                messagebox.showerror("エラー", f"Whisperの初期化に失敗しました: {str(whisper_error)}")
+            # 結果はセグメントが確定するたびに結果欄へ追記される
+            engine.run(self.file_paths)
                 
         except Exception as e:
             self._update_status(f"エラーが発生しました: {str(e)}", 0)
@@ -306,12 +495,6 @@ class WhisperTranscriberApp:
         finally:
             self.is_processing = False
     
-    def _get_default_output_dir(self):
-        """デフォルトの出力ディレクトリ（デスクトップの文字起こし結果フォルダ）を取得"""
-        desktop_path = os.path.join(os.path.expanduser("~"), "Desktop")
-        output_dir = os.path.join(desktop_path, "文字起こし結果")
-        return output_dir
-    
     def _ensure_output_dir_exists(self):
         """出力ディレクトリが存在しない場合は作成する"""
         if not os.path.exists(self.output_dir):
@@ -360,38 +543,69 @@ class WhisperTranscriberApp:
             except Exception as e:
                 messagebox.showerror("エラー", f"保存中にエラーが発生しました: {str(e)}")
     
-    def _save_file_result(self, file_name, text):
-        """個別のファイル結果を自動保存"""
-        if not self._ensure_output_dir_exists():
-            return False
-        
-        # 元のファイル名から拡張子を除去し、.txtを追加
-        base_name = os.path.splitext(file_name)[0]
-        output_file = os.path.join(self.output_dir, f"{base_name}.txt")
-        
-        try:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(text)
-            return True
-        except Exception as e:
-            messagebox.showerror("エラー", f"ファイル {file_name} の保存中にエラーが発生しました: {str(e)}")
-            return False
-    
     def _update_status(self, message, progress_value):
         def update():
             self.status.set(message)
             self.progress.set(progress_value)
         self.root.after(0, update)
     
-    def _update_result(self, text):
-        def update():
-            self.result_text.delete(1.0, tk.END)
-            self.result_text.insert(tk.END, text)
-        self.root.after(0, update)
+    def _result_header(self, index, file_name):
+        """結果欄の見出し（並列処理で他のファイルと交互になる場合は再表示する）"""
+        if self._last_result_index == index:
+            return ""
+        continued = "（続き）" if index in self._result_headers else ""
+        self._result_headers.add(index)
+        self._last_result_index = index
+        return f"# {file_name}{continued}\n\n"
+    
+    def _on_result_segments(self, index, file_path, segments):
+        """確定したセグメントを結果欄に追記"""
+        self.current_file_index = index
+        text = self._result_header(index, os.path.basename(file_path))
+        text += "".join(segment["text"] for segment in segments)
+        self._append_result(text)
+    
+    def _on_result_file_done(self, entry):
+        """ファイルの処理完了を結果欄に追記"""
+        text = self._result_header(entry["index"], entry["file"])
+        self._last_result_index = None
+        if entry.get("resumed"):
+            text += "（前回完了済み）\n\n"
+        elif entry["error"]:
+            text += f"\n（エラー）処理中にエラーが発生しました: {entry['error']}\n\n"
+        else:
+            save_status = "保存済み" if entry["saved"] else "保存失敗"
+            metrics = entry.get("metrics")
+            if metrics and metrics["rtf"] is not None:
+                save_status += (f"・処理時間 {format_duration(metrics['elapsed_seconds'])}"
+                                f"、実時間比 {metrics['rtf']:.2f}")
+            text += f"\n（{save_status}）\n\n"
+        self._append_result(text)
+    
+    def _append_result(self, text):
+        """結果欄への追記をまとめ、一定間隔でGUIスレッドから反映する"""
+        with self._result_lock:
+            self._pending_result.append(text)
+            if self._result_flush_scheduled:
+                return
+            self._result_flush_scheduled = True
+        self.root.after(RESULT_FLUSH_INTERVAL_MS, self._flush_result)
+    
+    def _flush_result(self):
+        with self._result_lock:
+            text = "".join(self._pending_result)
+            self._pending_result.clear()
+            self._result_flush_scheduled = False
+        self.result_text.insert(tk.END, text)
+        self.result_text.see(tk.END)
 
 def main():
+    # PyInstallerでパッケージ化した実行ファイルからワーカープロセスを起動するために必要
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = WhisperTranscriberApp(root)
+    if os.environ.get(STARTUP_PROBE_ENV):
+        root.after_idle(root.destroy)
     root.mainloop()
 
 if __name__ == "__main__":
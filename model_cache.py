@@ -0,0 +1,177 @@
+"""読み込み済みWhisperモデルのプロセス内キャッシュ
+
+モデル名・デバイス・バックエンドをキーにモデルを保持し、メモリ上限を超えた場合は
+最も長く使われていないモデルから解放する（LRU）。
+"""
+import gc
+import threading
+from collections import OrderedDict
+
+from backends import (BACKEND_FASTER_WHISPER, BACKEND_WHISPER_INT8, DEFAULT_BACKEND, load_model,
+                      resolve_device)
+
+# パラメータ数から推定できない場合のモデルサイズの目安（バイト）
+ESTIMATED_MODEL_BYTES = {
+    "tiny": 150 * 1024 ** 2,
+    "base": 300 * 1024 ** 2,
+    "small": 1000 * 1024 ** 2,
+    "medium": 3000 * 1024 ** 2,
+    "large": 6000 * 1024 ** 2,
+}
+# fp32のモデルに対する、int8で読み込んだ場合のメモリ使用量の割合
+_INT8_RATIO = {
+    # 全結合層の重みだけが1/4になる
+    BACKEND_WHISPER_INT8: 0.35,
+    # CTranslate2は埋め込みなども含めて量子化する
+    BACKEND_FASTER_WHISPER: 0.3,
+}
+
+
+def resolve_loader(spec=None):
+    """モデルの読み込み関数を返す
+
+    spec は "モジュール名:関数名" 形式の文字列で、loader(model_name, device, backend) として呼び出される。
+    ワーカープロセスにも渡せるよう、関数そのものではなく文字列で指定する。
+    未指定の場合は backends.load_model で読み込む。
+    """
+    if not spec:
+        return load_model
+    import importlib
+    module_name, _, function_name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def estimate_load_bytes(model_name, backend=DEFAULT_BACKEND, default=0):
+    """モデルを読み込む前に、読み込んだ後のメモリ使用量を見積もる（不明なモデルは default）"""
+    model_bytes = ESTIMATED_MODEL_BYTES.get(model_name.split(".")[0], default)
+    return int(model_bytes * _INT8_RATIO.get(backend, 1.0))
+
+
+def estimate_model_bytes(model, model_name):
+    """モデルが使用するメモリ量を推定する"""
+    # 量子化したモデルなど、パラメータから計算できないものは推定値を持っている
+    estimated = getattr(model, "estimated_bytes", None)
+    if estimated:
+        return estimated
+    try:
+        return sum(p.numel() * p.element_size() for p in model.parameters())
+    except Exception:
+        return ESTIMATED_MODEL_BYTES.get(model_name.split(".")[0], 0)
+
+
+class ModelCache:
+    """メモリ上限付きのLRUモデルキャッシュ（スレッドセーフ）"""
+
+    def __init__(self, memory_budget_bytes=4096 * 1024 ** 2, loader=None):
+        self.memory_budget_bytes = memory_budget_bytes
+        self._loader = loader or load_model
+        self._models = OrderedDict()  # (model_name, device, backend) -> (model, size)
+        self._loading = {}  # 読み込み中のキーごとのロック
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, model_name, device=None, backend=DEFAULT_BACKEND):
+        """モデルを返す（キャッシュにない場合は読み込む）"""
+        key = (model_name, resolve_device(device, backend), backend)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return self._models[key][0]
+            loading_lock = self._loading.setdefault(key, threading.Lock())
+
+        # 同じモデルを同時に読み込まないよう、キーごとのロックで待ち合わせる
+        with loading_lock:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    self.hits += 1
+                    return self._models[key][0]
+                self.misses += 1
+                # 読み込み中も上限を超えないよう、読み込む前に空きを作っておく
+                self._evict(keep=None, incoming=estimate_load_bytes(model_name, backend))
+
+            try:
+                model = self._loader(*key)
+            except BaseException:
+                with self._lock:
+                    self._loading.pop(key, None)
+                raise
+            size = estimate_model_bytes(model, model_name)
+
+            # キャッシュへの追加と同時にロックを外し、その間に届いた呼び出しが読み込み直さないようにする
+            with self._lock:
+                self._models[key] = (model, size)
+                self._loading.pop(key, None)
+                self._evict(keep=key)
+        return model
+
+    def _evict(self, keep, incoming=0):
+        """メモリ上限を超えている間（incoming はこれから読み込む分）、最も古いモデルから解放する"""
+        evicted = False
+        while self.memory_usage() + incoming > self.memory_budget_bytes:
+            oldest = next((key for key in self._models if key != keep), None)
+            if oldest is None:
+                break
+            del self._models[oldest]
+            evicted = True
+        if evicted:
+            self._release_memory()
+
+    def _release_memory(self):
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+    def memory_usage(self):
+        """キャッシュ中のモデルの推定メモリ使用量（バイト）"""
+        return sum(size for _, size in self._models.values())
+
+    def cached_models(self):
+        """キャッシュ中のキーを古い順に返す"""
+        with self._lock:
+            return list(self._models)
+
+    def clear(self):
+        """全てのモデルを解放する"""
+        with self._lock:
+            self._models.clear()
+        self._release_memory()
+
+    def warm_up(self, model_name, device=None, on_done=None, backend=DEFAULT_BACKEND):
+        """バックグラウンドスレッドでモデルを読み込んでおく
+
+        on_done(error) は読み込み完了時（失敗時は例外を引数に）呼び出される。
+        """
+        def run():
+            error = None
+            try:
+                self.get(model_name, device, backend)
+            except Exception as e:
+                error = e
+            if on_done:
+                on_done(error)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_model_cache():
+    """アプリケーション全体で共有するモデルキャッシュを返す"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            from settings import load_settings
+            budget_mb = load_settings()["model_cache_budget_mb"]
+            _default_cache = ModelCache(memory_budget_bytes=budget_mb * 1024 ** 2)
+        return _default_cache
@@ -0,0 +1,184 @@
+"""音声の先読みデコード
+
+文字起こし中のファイルの推論と並行して、これから処理するファイルを
+バックグラウンドスレッドで16kHz モノラルのPCMにデコードしておく。
+先読みするファイル数には上限があり、大きな音声は一時ファイルに退避して
+必要な範囲だけをメモリマップで読み出すため、メモリ使用量は一定に収まる。
+"""
+import collections
+import os
+import tempfile
+import threading
+
+from audio import READ_SIZE, SAMPLE_RATE, open_pcm_stream
+
+# 先読みしておくファイル数
+DEFAULT_PREFETCH = 2
+# デコード済みのPCMがこの大きさを超えたら一時ファイルに退避する（約35分）
+DEFAULT_SPILL_BYTES = 64 * 1024 ** 2
+
+
+class DecodedAudio:
+    """バックグラウンドでデコード中・デコード済みの16bit PCM
+
+    デコードの途中でも、デコード済みの範囲は open_stream() で読み出せる
+    （まだデコードされていない範囲を読む場合は、デコードされるまで待つ）。
+    """
+
+    def __init__(self, file_path, spill_bytes=DEFAULT_SPILL_BYTES, sample_rate=SAMPLE_RATE):
+        self.file_path = file_path
+        self.spill_bytes = spill_bytes
+        self.sample_rate = sample_rate
+        self.error = None
+        self._buffer = bytearray()
+        self._spill_path = None
+        self._spill_file = None
+        self._size = 0
+        self._done = False
+        self._closed = False
+        self._cond = threading.Condition()
+
+    @property
+    def spilled(self):
+        return self._spill_path is not None
+
+    def start(self):
+        """デコード用のスレッドを起動する"""
+        thread = threading.Thread(target=self._decode, name="audio-prefetch", daemon=True)
+        thread.start()
+        return self
+
+    def _append(self, data):
+        with self._cond:
+            if self._closed:
+                return
+            if self._spill_file is None and self._size + len(data) > self.spill_bytes:
+                fd, self._spill_path = tempfile.mkstemp(prefix="transcriber_", suffix=".pcm")
+                self._spill_file = os.fdopen(fd, 'wb')
+                self._spill_file.write(self._buffer)
+                self._buffer = bytearray()
+            if self._spill_file is not None:
+                self._spill_file.write(data)
+                # 読み出し側がメモリマップで参照できるよう、OSに書き出しておく
+                self._spill_file.flush()
+            else:
+                self._buffer.extend(data)
+            self._size += len(data)
+            self._cond.notify_all()
+
+    def _decode(self):
+        eof = False
+        stream = None
+        try:
+            stream = open_pcm_stream(self.file_path, sample_rate=self.sample_rate)
+            while not self._closed:
+                data = stream.read(READ_SIZE)
+                if not data:
+                    eof = True
+                    break
+                self._append(data)
+        except Exception as e:
+            self.error = e
+        finally:
+            if stream is not None:
+                try:
+                    stream.close(check=eof)
+                except Exception as e:
+                    self.error = e
+            with self._cond:
+                self._done = True
+                if self._spill_file is not None:
+                    self._spill_file.close()
+                    self._spill_file = None
+                self._cond.notify_all()
+
+    def read_bytes(self, start, end):
+        """start〜endバイトの範囲を返す（デコードが終わっていれば末尾までの分のみ）"""
+        with self._cond:
+            while self._size < end and not self._done:
+                self._cond.wait()
+            end = min(end, self._size)
+            if start >= end:
+                return b""
+            if not self.spilled:
+                return bytes(self._buffer[start:end])
+            path = self._spill_path
+        import numpy as np
+
+        mapped = np.memmap(path, dtype=np.uint8, mode='r', offset=start, shape=(end - start,))
+        try:
+            return mapped.tobytes()
+        finally:
+            del mapped
+
+    def open_stream(self, start_seconds=0):
+        """audio.open_pcm_stream と同じ read()/close() で読み出すストリームを返す"""
+        return _DecodedStream(self, int(start_seconds * self.sample_rate) * 2)
+
+    def close(self):
+        """デコードを中止し、一時ファイルを削除する"""
+        with self._cond:
+            self._closed = True
+            self._buffer = bytearray()
+            path, self._spill_path = self._spill_path, None
+            while not self._done:
+                self._cond.wait()
+        if path:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class _DecodedStream:
+    def __init__(self, audio, position):
+        self._audio = audio
+        self._position = position
+
+    def read(self, size):
+        data = self._audio.read_bytes(self._position, self._position + size)
+        self._position += len(data)
+        return data
+
+    def close(self, check=True):
+        if check and self._audio.error is not None:
+            raise RuntimeError(f"音声の読み込みに失敗しました: {str(self._audio.error)}")
+
+
+class AudioPrefetcher:
+    """処理する順に、最大 prefetch 件先のファイルまでデコードしておく
+
+    get() で受け取った DecodedAudio は、使い終わったら close() すること。
+    """
+
+    def __init__(self, file_paths, prefetch=DEFAULT_PREFETCH, spill_bytes=DEFAULT_SPILL_BYTES):
+        self.prefetch = prefetch
+        self.spill_bytes = spill_bytes
+        self._pending = collections.deque(file_paths)
+        self._ready = {}
+        self._fill()
+
+    def _fill(self):
+        while len(self._ready) < self.prefetch and self._pending:
+            path = self._pending.popleft()
+            if path not in self._ready:
+                self._ready[path] = DecodedAudio(path, self.spill_bytes).start()
+
+    def get(self, file_path):
+        """ファイルのデコード結果を返す（先読みしていない場合はここでデコードを開始する）"""
+        audio = self._ready.pop(file_path, None)
+        if audio is None:
+            try:
+                self._pending.remove(file_path)
+            except ValueError:
+                pass
+            audio = DecodedAudio(file_path, self.spill_bytes).start()
+        self._fill()
+        return audio
+
+    def close(self):
+        """先読み済みで使われなかったデコード結果を破棄する"""
+        self._pending.clear()
+        for audio in self._ready.values():
+            audio.close()
+        self._ready.clear()
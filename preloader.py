@@ -0,0 +1,60 @@
+"""重いモジュール（whisper/torch）のバックグラウンド読み込み
+
+whisperのimportはtorchの読み込みを伴い数秒かかるため、ウィンドウの表示を
+待たせないよう起動後に別スレッドで読み込んでおく。
+"""
+import importlib
+import threading
+import time
+
+# 起動後に読み込んでおくモジュール（whisperがtorchも読み込む）
+PRELOAD_MODULES = ("whisper",)
+
+
+class ModulePreloader:
+    """バックグラウンドスレッドでモジュールをimportし、完了を通知する"""
+
+    def __init__(self, modules=PRELOAD_MODULES):
+        self.modules = modules
+        # 読み込みに失敗した場合の例外と、読み込みにかかった時間（秒）
+        self.error = None
+        self.seconds = None
+        self._done = threading.Event()
+        self._thread = None
+
+    def start(self, on_done=None):
+        """読み込みを開始する（読み込み中の場合は何もしない）
+
+        on_done(error) は読み込み完了時（失敗時は例外を引数に）読み込みスレッドから呼び出される。
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._done.clear()
+        self.error = None
+
+        def run():
+            start = time.perf_counter()
+            try:
+                # 起動後にインストールされたパッケージも見つけられるようにする
+                importlib.invalidate_caches()
+                for name in self.modules:
+                    importlib.import_module(name)
+            except Exception as e:
+                self.error = e
+            self.seconds = time.perf_counter() - start
+            self._done.set()
+            if on_done:
+                on_done(self.error)
+
+        self._thread = threading.Thread(target=run, name="module-preloader", daemon=True)
+        self._thread.start()
+
+    def is_done(self):
+        return self._done.is_set()
+
+    def is_ready(self):
+        """読み込みが完了し、成功しているか"""
+        return self._done.is_set() and self.error is None
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
@@ -0,0 +1,92 @@
+"""モデルを読み込んだまま常駐するワーカースレッド
+
+監視フォルダ（watch_service）とHTTPサーバー（http_service）で共通に使う。
+ワーカーごとに1回だけエンジンを作ってモデルを読み込み、停止されるまで
+ジョブを1件ずつ取り出して処理する。
+"""
+import threading
+
+# ワーカーが停止要求を確認する間隔（秒）
+TAKE_TIMEOUT = 1.0
+
+
+class ResidentWorkers:
+    """モデルを読み込んだまま常駐し、ジョブを順に処理するワーカースレッド群
+
+    make_engine() は設定済みの TranscriptionEngine を返す関数で、ワーカーごとに
+    1回だけ呼び出される。take(timeout) は次のジョブを返す関数（timeout 秒待っても
+    ない場合はNone）、process(engine, job) はジョブを1件処理する関数。
+    """
+
+    def __init__(self, make_engine, take, process, workers=1, name="worker", on_status=None):
+        self.make_engine = make_engine
+        self.take = take
+        self.process = process
+        self.workers = max(1, workers)
+        self.name = name
+        self.on_status = on_status
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._ready = 0
+        self._failed = 0
+        self._busy = 0
+
+    @property
+    def started(self):
+        return bool(self._threads)
+
+    @property
+    def stopping(self):
+        return self._stop.is_set()
+
+    def _status(self, message):
+        if self.on_status:
+            self.on_status(message)
+
+    def counts(self):
+        """(準備ができたワーカー数, モデルを読み込めなかったワーカー数, 処理中のワーカー数)"""
+        with self._lock:
+            return self._ready, self._failed, self._busy
+
+    def _worker(self, number):
+        try:
+            engine = self.make_engine()
+            engine.load_model()
+        except Exception as e:
+            with self._lock:
+                self._failed += 1
+            self._status(f"ワーカー {number}: モデルの読み込みに失敗しました: {str(e)}")
+            return
+        with self._lock:
+            self._ready += 1
+        self._status(f"ワーカー {number}: 準備ができました")
+
+        while not self._stop.is_set():
+            job = self.take(TAKE_TIMEOUT)
+            if job is None:
+                continue
+            with self._lock:
+                self._busy += 1
+            try:
+                self.process(engine, job)
+            finally:
+                with self._lock:
+                    self._busy -= 1
+
+    def start(self):
+        """ワーカースレッドを起動する"""
+        for number in range(1, self.workers + 1):
+            thread = threading.Thread(target=self._worker, args=(number,),
+                                      name=f"{self.name}-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def request_stop(self):
+        """新しいジョブの取り出しを止める（処理中のジョブは最後まで処理される）"""
+        self._stop.set()
+
+    def join(self, timeout=None):
+        """処理中のジョブの完了を待つ"""
+        for thread in self._threads:
+            thread.join(timeout)
@@ -0,0 +1,65 @@
+"""ユーザー設定の保存と読み込み"""
+import json
+import os
+
+# 設定やキャッシュを保存するアプリケーションディレクトリ
+APP_DIR = os.path.join(os.path.expanduser("~"), ".simple_transcriber")
+SETTINGS_FILE = os.path.join(APP_DIR, "settings.json")
+
+DEFAULT_SETTINGS = {
+    "model": "tiny",
+    # 推論バックエンド（whisper / whisper-int8 / faster-whisper）
+    "backend": "whisper",
+    "language": "ja",
+    # 読み込み済みモデルを保持するメモリの上限（MB）
+    "model_cache_budget_mb": 4096,
+    # 起動時に前回使用したモデルをバックグラウンドで読み込む
+    "warm_up_on_start": True,
+    # 同じ音声・設定の文字起こし結果を再利用する
+    "use_transcript_cache": True,
+    "transcript_cache_max_mb": 512,
+    # 無音区間を検出し、発話部分だけを文字起こしする
+    "use_vad": False,
+    # 30秒以下の音声をまとめて推論する数（1でまとめない）
+    "batch_size": 8,
+    # 保存する形式（txt, srt, vtt, tsv, json）
+    "output_formats": ["txt"],
+    # 単語ごとの時刻を求めてJSONに出力する
+    "word_timestamps": False,
+    # モデルの自動選択（auto）で目標とする処理時間（音声の長さに対する倍率）
+    "auto_target_ratio": 1.0,
+    # 処理中のファイルと並行してデコードしておく後続のファイル数（0で先読みしない）
+    "prefetch_files": 2,
+    # ファイルごとの処理時間などの計測結果を ~/.simple_transcriber/logs に記録する
+    "write_run_log": True,
+}
+
+
+def get_app_dir(*parts):
+    """アプリケーションディレクトリ（またはその配下のパス）を返す"""
+    path = os.path.join(APP_DIR, *parts)
+    os.makedirs(os.path.dirname(path) if parts else path, exist_ok=True)
+    return path
+
+
+def load_settings():
+    """保存済みの設定を読み込む（存在しない・壊れている場合はデフォルト値）"""
+    settings = dict(DEFAULT_SETTINGS)
+    try:
+        with open(SETTINGS_FILE, 'r', encoding='utf-8') as f:
+            settings.update(json.load(f))
+    except (OSError, ValueError):
+        pass
+    return settings
+
+
+def save_settings(settings):
+    """設定を保存する（失敗しても処理は継続する）"""
+    try:
+        os.makedirs(APP_DIR, exist_ok=True)
+        temp_file = SETTINGS_FILE + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(settings, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, SETTINGS_FILE)
+    except OSError as e:
+        print(f"設定の保存に失敗しました: {str(e)}")
@@ -0,0 +1,138 @@
+"""音声の内容をキーにした文字起こし結果のディスクキャッシュ
+
+同じ音声を同じモデル・言語・デコード設定で処理した結果を保存し、
+再実行時には文字起こしを行わずに保存済みの結果を返す。
+"""
+import hashlib
+import json
+import os
+
+from settings import get_app_dir
+
+# この大きさ以下のファイルは全体を、それより大きいファイルは先頭・中央・末尾をハッシュする
+_FULL_HASH_LIMIT = 4 * 1024 * 1024
+_SAMPLE_SIZE = 1024 * 1024
+
+
+def fast_file_hash(file_path):
+    """ファイル内容の高速なハッシュ値を計算する
+
+    大きなファイルはサイズと先頭・中央・末尾の一部のみを読むため、
+    数GBの動画でも読み込み量は数MBに収まる。
+    """
+    size = os.path.getsize(file_path)
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(str(size).encode())
+    with open(file_path, 'rb') as f:
+        if size <= _FULL_HASH_LIMIT:
+            digest.update(f.read())
+        else:
+            for offset in (0, size // 2 - _SAMPLE_SIZE // 2, size - _SAMPLE_SIZE):
+                f.seek(offset)
+                digest.update(f.read(_SAMPLE_SIZE))
+    return digest.hexdigest()
+
+
+def make_cache_key(file_path, model_name, language, **options):
+    """音声の内容と文字起こし設定からキャッシュキーを作成する"""
+    params = {
+        "audio": fast_file_hash(file_path),
+        "model": model_name,
+        "language": language,
+        "options": options,
+    }
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+class TranscriptCache:
+    """サイズ上限付きの文字起こし結果キャッシュ
+
+    上限を超えた場合は最終使用日時が古いものから削除する。
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=512 * 1024 ** 2):
+        self.cache_dir = cache_dir or get_app_dir("transcripts")
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """キャッシュされた結果辞書を返す（ない場合はNone）"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # 最終使用日時を更新して削除の優先度を下げる
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return result
+
+    def put(self, key, result):
+        """結果辞書を保存し、上限を超えていれば古いものを削除する"""
+        entry = {
+            "text": result["text"],
+            "segments": result.get("segments", []),
+            "language": result.get("language"),
+        }
+        path = self._path(key)
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+        self.evict()
+
+    def invalidate(self, key):
+        """指定したキーのキャッシュを削除する"""
+        try:
+            os.remove(self._path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def clear(self):
+        """全てのキャッシュを削除し、削除した件数を返す"""
+        removed = 0
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def size(self):
+        """キャッシュの合計サイズ（バイト）"""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """合計サイズが上限以下になるまで、最終使用日時が古いものから削除する"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+                total -= size
+            except OSError:
+                pass
+
@@ -0,0 +1,142 @@
+"""エネルギーベースの音声区間検出（VAD）
+
+波形をフレームごとのRMSに変換して発話区間を検出し、無音部分を取り除いた
+音声だけをモデルに渡す。タイムスタンプは元の音声の時刻に戻して返す。
+処理は全てNumPyのベクトル演算で行う。
+"""
+from audio import SAMPLE_RATE
+
+FRAME_SECONDS = 0.03
+# 推定した雑音レベルからこの値（dB）以上大きいフレームを発話とみなす
+THRESHOLD_MARGIN_DB = 12.0
+# 雑音レベルの推定値がこれより小さい場合はこの値を使う（デジタル無音対策）
+MIN_NOISE_FLOOR_DB = -60.0
+# 雑音レベルの推定値の上限。音楽や空調の上の発話など、常に一定以上の音量がある音声で
+# 全体を雑音とみなさないようにする
+MAX_NOISE_FLOOR_DB = -40.0
+MIN_SPEECH_SECONDS = 0.25
+MIN_SILENCE_SECONDS = 0.6
+PAD_SECONDS = 0.2
+# 連結する発話区間の間に挟む無音（単語が繋がって認識されるのを防ぐ）
+GAP_SECONDS = 0.3
+
+
+def _runs(mask):
+    """真偽値配列の連続区間を (開始, 終了, 値) の配列で返す"""
+    import numpy as np
+
+    if len(mask) == 0:
+        return np.empty(0, int), np.empty(0, int), np.empty(0, bool)
+    change = np.flatnonzero(np.diff(mask.astype(np.int8))) + 1
+    starts = np.concatenate(([0], change))
+    ends = np.concatenate((change, [len(mask)]))
+    return starts, ends, mask[starts]
+
+
+def detect_speech(audio, sample_rate=SAMPLE_RATE):
+    """発話区間を (開始サンプル, 終了サンプル) のリストで返す"""
+    import numpy as np
+
+    frame = int(FRAME_SECONDS * sample_rate)
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return [(0, len(audio))] if len(audio) else []
+
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    rms = np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=1))
+    db = 20 * np.log10(np.maximum(rms, 1e-10))
+
+    low, high = np.percentile(db, [10, 90])
+    if high - low < THRESHOLD_MARGIN_DB and low > MAX_NOISE_FLOOR_DB:
+        # 音量がほぼ一定で発話と雑音を区別できないため、全体を発話として扱う
+        return [(0, len(audio))]
+    noise_floor = min(max(low, MIN_NOISE_FLOOR_DB), MAX_NOISE_FLOOR_DB)
+    mask = db > noise_floor + THRESHOLD_MARGIN_DB
+
+    # 短い無音は発話の一部として埋める
+    starts, ends, values = _runs(mask)
+    short_silence = ~values & ((ends - starts) * FRAME_SECONDS < MIN_SILENCE_SECONDS)
+    short_silence[[0, -1]] = False  # 先頭・末尾の無音は埋めない
+    for start, end in zip(starts[short_silence], ends[short_silence]):
+        mask[start:end] = True
+
+    # 短すぎる発話は雑音として除く
+    starts, ends, values = _runs(mask)
+    keep = values & ((ends - starts) * FRAME_SECONDS >= MIN_SPEECH_SECONDS)
+
+    pad = int(PAD_SECONDS * sample_rate)
+    spans = []
+    for start, end in zip(starts[keep] * frame, ends[keep] * frame):
+        start = max(0, start - pad)
+        end = min(len(audio), end + pad)
+        if spans and start <= spans[-1][1]:
+            spans[-1] = (spans[-1][0], end)
+        else:
+            spans.append((int(start), int(end)))
+    # 端数のフレームまで発話が続いている場合は音声の末尾まで含める
+    if spans and spans[-1][1] >= n_frames * frame - pad:
+        spans[-1] = (spans[-1][0], len(audio))
+    return spans
+
+
+class SpeechMap:
+    """発話区間だけを連結した音声と、元の音声の時刻との対応"""
+
+    def __init__(self, audio, spans, sample_rate=SAMPLE_RATE):
+        import numpy as np
+
+        gap = np.zeros(int(GAP_SECONDS * sample_rate), dtype=audio.dtype)
+        pieces = []
+        # (連結後の開始秒, 元の開始秒, 長さ秒)
+        self.mapping = []
+        position = 0
+        for i, (start, end) in enumerate(spans):
+            if i:
+                pieces.append(gap)
+                position += len(gap)
+            pieces.append(audio[start:end])
+            self.mapping.append((position / sample_rate, start / sample_rate,
+                                 (end - start) / sample_rate))
+            position += end - start
+        self.audio = np.concatenate(pieces) if pieces else audio[:0]
+        self.speech_seconds = sum(length for _, _, length in self.mapping)
+        self.total_seconds = len(audio) / sample_rate
+
+    def to_original(self, t):
+        """連結後の音声の時刻を元の音声の時刻に変換する"""
+        for compact_start, original_start, length in reversed(self.mapping):
+            if t >= compact_start:
+                return original_start + min(t - compact_start, length)
+        return self.mapping[0][1] if self.mapping else t
+
+    def to_original_result(self, result):
+        """連結後の音声に対する結果辞書のタイムスタンプを元の音声の時刻に戻す"""
+        segments = []
+        for segment in result.get("segments", []):
+            segment = dict(segment, start=self.to_original(segment["start"]),
+                           end=self.to_original(segment["end"]))
+            if "words" in segment:
+                segment["words"] = [dict(word, start=self.to_original(word["start"]),
+                                         end=self.to_original(word["end"]))
+                                    for word in segment["words"]]
+            segments.append(segment)
+        return dict(result, segments=segments, audio_seconds=self.total_seconds,
+                    skipped_seconds=self.total_seconds - self.speech_seconds)
+
+    def empty_result(self, language=None):
+        """発話がなかった場合の結果辞書"""
+        return {"text": "", "segments": [], "language": language,
+                "audio_seconds": self.total_seconds, "skipped_seconds": self.total_seconds}
+
+
+def transcribe_with_vad(model, audio, language=None, **decode_options):
+    """発話区間だけを文字起こしし、元の時刻に戻した結果辞書を返す
+
+    結果には処理した音声の長さ（audio_seconds）と、
+    スキップした無音の長さ（skipped_seconds）が含まれる。
+    """
+    speech = SpeechMap(audio, detect_speech(audio))
+    if speech.speech_seconds == 0:
+        return speech.empty_result(language)
+    result = model.transcribe(speech.audio, language=language, **decode_options)
+    return speech.to_original_result(result)
@@ -0,0 +1,115 @@
+"""監視フォルダの常駐処理
+
+入力フォルダに追加されたファイルを永続ジョブキューに登録し、モデルを
+読み込んだまま常駐するワーカーが順に文字起こしして出力先に保存する。
+"""
+import os
+import time
+
+from engine import AUDIO_EXTENSIONS
+from job_queue import JobQueue, file_signature
+from resident import ResidentWorkers
+from watcher import DEFAULT_POLL_INTERVAL, DEFAULT_SETTLE_SECONDS, DirectoryWatcher
+
+# キューの状態を通知する間隔（秒）
+DEFAULT_STATS_INTERVAL = 60.0
+
+
+class WatchService:
+    """入力フォルダを監視し、ワーカースレッドで文字起こしを続ける
+
+    make_engine() は設定済みの TranscriptionEngine を返す関数（resident.ResidentWorkers を参照）。
+    """
+
+    def __init__(self, input_dir, output_dir, make_engine, workers=1, recursive=False,
+                 settle_seconds=DEFAULT_SETTLE_SECONDS, poll_interval=DEFAULT_POLL_INTERVAL,
+                 stats_interval=DEFAULT_STATS_INTERVAL, on_status=None, on_stats=None):
+        self.input_dir = os.path.abspath(input_dir)
+        self.output_dir = os.path.abspath(output_dir)
+        self.workers = max(1, workers)
+        self.stats_interval = stats_interval
+        self.on_status = on_status
+        self.on_stats = on_stats
+        self.queue = JobQueue.for_output_dir(self.output_dir)
+        self.watcher = DirectoryWatcher(self.input_dir, self._on_file, AUDIO_EXTENSIONS,
+                                        recursive=recursive, settle_seconds=settle_seconds,
+                                        poll_interval=poll_interval,
+                                        # 出力先が入力フォルダの中にある場合だけ除外される
+                                        exclude_dirs=[self.output_dir])
+        self._workers = ResidentWorkers(make_engine,
+                                        lambda timeout: self.queue.claim(timeout=timeout),
+                                        self._process, workers=self.workers, name="watch-worker",
+                                        on_status=on_status)
+        self._started_at = None
+
+    def _status(self, message):
+        if self.on_status:
+            self.on_status(message)
+
+    def _on_file(self, path):
+        try:
+            if self.queue.enqueue(path, file_signature(path)):
+                self._status(f"キューに追加しました: {path}")
+        except OSError:
+            # 通知の直後に削除・移動されたファイル
+            pass
+
+    def stats(self):
+        """キューの深さ・処理速度などの統計情報"""
+        stats = self.queue.stats()
+        stats.update(workers=self.workers, busy_workers=self._workers.counts()[2],
+                     watch_mode=self.watcher.mode,
+                     uptime_seconds=time.time() - self._started_at if self._started_at else 0.0)
+        return stats
+
+    def _process(self, engine, job):
+        path = job["path"]
+        if not os.path.exists(path):
+            self.queue.fail(job["id"], "ファイルが見つかりません")
+            return
+        try:
+            entry = engine.run([path])[0]
+            error = entry["error"] or (None if entry["saved"] else "保存失敗")
+        except Exception as e:
+            entry = None
+            error = str(e)
+        if error:
+            retry = self.queue.fail(job["id"], error)
+            self._status(f"処理に失敗しました{'（再試行します）' if retry else ''}: {path}: {error}")
+            return
+        metrics = entry.get("metrics") or {}
+        self.queue.complete(job["id"], entry["output_file"], metrics.get("audio_seconds"))
+        self._status(f"保存しました: {entry['output_file']}")
+
+    def start(self):
+        """ワーカースレッドを起動する"""
+        self._started_at = time.time()
+        recovered = self.queue.recover()
+        if recovered:
+            self._status(f"前回処理中だった{recovered}個のファイルを再度処理します")
+        self._workers.start()
+
+    def serve_forever(self):
+        """停止されるまで入力フォルダを監視する（Ctrl+Cで停止）"""
+        if not self._workers.started:
+            self.start()
+        self._status(f"{self.input_dir} を監視しています（{self.watcher.mode}、"
+                     f"ワーカー {self.workers}個、出力先: {self.output_dir}）")
+        last_stats = time.monotonic()
+        try:
+            while not self._workers.stopping:
+                self.watcher.poll()
+                if self.on_stats and time.monotonic() - last_stats >= self.stats_interval:
+                    last_stats = time.monotonic()
+                    self.on_stats(self.stats())
+        except KeyboardInterrupt:
+            self._status("停止しています（処理中のファイルの完了を待ちます）...")
+        finally:
+            self.stop()
+
+    def stop(self, timeout=None):
+        """新しいジョブの取り出しを止め、処理中のファイルの完了を待つ"""
+        self._workers.request_stop()
+        self.queue.wake_all()
+        self._workers.join(timeout)
+        self.watcher.close()
@@ -0,0 +1,191 @@
+"""入力フォルダの監視
+
+Linuxではinotifyで変更を検知し、それ以外の環境やinotifyが使えない場合は
+定期的にフォルダを走査する。書き込み途中のファイルを処理しないよう、
+サイズと更新日時が一定時間変化しなくなったファイルだけを通知する。
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+DEFAULT_SETTLE_SECONDS = 5.0
+DEFAULT_POLL_INTERVAL = 2.0
+# inotifyを使う場合も、ネットワークフォルダなど通知が届かない変更に備えて定期的に走査する
+INOTIFY_RESCAN_SECONDS = 60.0
+
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Inotify:
+    """ctypesによるinotifyの最小限のラッパー"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 に失敗しました")
+        self._dirs = {}  # watch descriptor -> ディレクトリのパス
+
+    def add_watch(self, path):
+        wd = self._add_watch(self.fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch に失敗しました: {path}")
+        self._dirs[wd] = path
+
+    def read_events(self, timeout):
+        """timeout秒まで待ち、(パス, ディレクトリかどうか) のリストを返す"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, name_length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + name_length].rstrip(b"\0")
+            offset += name_length
+            directory = self._dirs.get(wd)
+            if directory is not None and name:
+                events.append((os.path.join(directory, os.fsdecode(name)), bool(mask & _IN_ISDIR)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class DirectoryWatcher:
+    """入力フォルダに追加・更新された音声ファイルを、書き込みが落ち着いてから通知する
+
+    on_file(path) は、サイズと更新日時が settle_seconds 秒変化しなかったファイルについて
+    poll() を呼び出したスレッドから呼び出される。起動時に既にあるファイルも対象になる。
+    """
+
+    def __init__(self, input_dir, on_file, extensions, recursive=False,
+                 settle_seconds=DEFAULT_SETTLE_SECONDS, poll_interval=DEFAULT_POLL_INTERVAL,
+                 exclude_dirs=(), use_inotify=True):
+        self.input_dir = os.path.abspath(input_dir)
+        self.on_file = on_file
+        self.extensions = tuple(extensions)
+        self.recursive = recursive
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        # 出力先が入力フォルダの中にある場合などに、監視対象から除くフォルダ
+        # （入力フォルダ自身やその親を指定すると何も監視できなくなるため、入力フォルダの
+        # 下にあるフォルダだけを除外する）
+        self.exclude_dirs = [d for d in (os.path.abspath(d) for d in exclude_dirs)
+                             if d.startswith(self.input_dir.rstrip(os.sep) + os.sep)]
+        self._candidates = {}  # パス -> (サイズ, 更新日時, 変化しなくなった時刻)
+        self._notified = {}  # パス -> 通知したときの (サイズ, 更新日時)
+        self._last_scan = None
+        self._inotify = None
+        if use_inotify and sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify()
+                for directory in self._directories():
+                    self._inotify.add_watch(directory)
+            except (OSError, AttributeError) as e:
+                print(f"inotifyを使用できないため、定期的な走査で監視します: {str(e)}")
+                if self._inotify is not None:
+                    self._inotify.close()
+                self._inotify = None
+
+    @property
+    def mode(self):
+        return "inotify" if self._inotify is not None else "polling"
+
+    def _is_excluded(self, path):
+        return any(path == d or path.startswith(d + os.sep) for d in self.exclude_dirs)
+
+    def _directories(self):
+        if not self.recursive:
+            return [self.input_dir]
+        directories = []
+        for dir_path, dir_names, _ in os.walk(self.input_dir):
+            dir_names[:] = [d for d in dir_names
+                            if not self._is_excluded(os.path.join(dir_path, d))]
+            directories.append(dir_path)
+        return directories
+
+    def _is_target(self, path):
+        name = os.path.basename(path)
+        return (not name.startswith(".") and name.lower().endswith(self.extensions)
+                and not self._is_excluded(path))
+
+    def _scan(self):
+        """フォルダ内の音声ファイルを全て候補に加える"""
+        for directory in self._directories():
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_file() and self._is_target(entry.path):
+                    self._candidates.setdefault(entry.path, None)
+        self._last_scan = time.monotonic()
+
+    def _check_candidates(self):
+        """書き込みが落ち着いた候補を通知する"""
+        now = time.monotonic()
+        for path, previous in list(self._candidates.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # 削除・移動されたファイル
+                del self._candidates[path]
+                continue
+            current = (stat.st_size, stat.st_mtime_ns)
+            if self._notified.get(path) == current:
+                del self._candidates[path]
+                continue
+            if previous is None or previous[:2] != current:
+                self._candidates[path] = current + (now,)
+            elif now - previous[2] >= self.settle_seconds:
+                del self._candidates[path]
+                self._notified[path] = current
+                self.on_file(path)
+
+    def poll(self):
+        """変更を待って処理する（最大で poll_interval 秒ブロックする）"""
+        rescan = INOTIFY_RESCAN_SECONDS if self._inotify is not None else self.poll_interval
+        if self._last_scan is None or time.monotonic() - self._last_scan >= rescan:
+            self._scan()
+        if self._inotify is not None:
+            # 候補がある間は落ち着いたかを確認するため、待ち時間を短くする
+            timeout = min(self.poll_interval, self.settle_seconds) if self._candidates else self.poll_interval
+            for path, is_dir in self._inotify.read_events(timeout):
+                if is_dir:
+                    if self.recursive and not self._is_excluded(path):
+                        try:
+                            self._inotify.add_watch(path)
+                        except OSError:
+                            pass
+                        # 監視を追加する前にフォルダ内に作られたファイルを拾う
+                        self._last_scan = None
+                elif self._is_target(path):
+                    self._candidates.setdefault(path, None)
+        else:
+            time.sleep(self.poll_interval)
+        self._check_candidates()
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
@@ -0,0 +1,153 @@
+"""複数プロセスでの並列文字起こし
+
+各ワーカープロセスは起動時に一度だけモデルを読み込み、共有キューから
+ファイルを取り出して処理する。結果は完了した順に親プロセスへ返される。
+"""
+import multiprocessing
+import os
+import queue
+import time
+
+from backends import DEFAULT_BACKEND, set_cpu_threads
+from chunking import transcribe_file
+from instrumentation import (STAGE_MODEL_LOAD, StageTimer, current_rss_bytes, peak_rss_bytes,
+                             rss_growth_bytes)
+from model_cache import resolve_loader
+
+# ワーカープロセス内で常駐するモデルと設定
+_worker_model = None
+_worker_language = None
+_worker_options = {}
+_worker_event_queue = None
+_worker_init_error = None
+# モデルの読み込み時間（最初のタスクの計測結果に含めて親プロセスへ返す）
+_worker_load_seconds = None
+
+
+def default_torch_threads(workers):
+    """ワーカー数に応じた1プロセスあたりのtorchスレッド数（コアの過剰割り当てを避ける）"""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def set_torch_threads(torch_threads):
+    """torchのintra-opスレッド数を設定する（0またはNoneの場合は変更しない）
+
+    faster-whisper のモデルは torch を使わないため、読み込み時に同じスレッド数を渡す。
+    """
+    set_cpu_threads(torch_threads)
+    if torch_threads:
+        try:
+            import torch
+        except ImportError:
+            # torchを使わないモデル（ベンチマークのスタブなど）ではスレッド数の設定は不要
+            return
+        torch.set_num_threads(torch_threads)
+
+
+def _init_worker(model_name, language, torch_threads, transcribe_options, event_queue,
+                 model_loader, backend):
+    """ワーカープロセスの初期化: スレッド数を設定し、モデルを一度だけ読み込む"""
+    global _worker_model, _worker_language, _worker_options, _worker_event_queue
+    global _worker_init_error, _worker_load_seconds
+    _worker_language = language
+    _worker_options = transcribe_options
+    _worker_event_queue = event_queue
+    # 初期化で例外を送出するとPoolがワーカーを再起動し続けるため、エラーは各タスクで返す
+    try:
+        set_torch_threads(torch_threads)
+        timer = StageTimer()
+        with timer.stage(STAGE_MODEL_LOAD):
+            _worker_model = resolve_loader(model_loader)(model_name, None, backend)
+        _worker_load_seconds = timer.seconds[STAGE_MODEL_LOAD]
+    except Exception as e:
+        _worker_init_error = f"モデルの読み込みに失敗しました: {str(e)}"
+
+
+def _transcribe_task(task):
+    """ワーカープロセスで1ファイルを処理し、(index, path, result, error) を返す"""
+    global _worker_load_seconds
+    index, file_path, resume_state = task
+    if _worker_init_error:
+        return index, file_path, None, _worker_init_error
+    timer = StageTimer()
+    if _worker_load_seconds is not None:
+        timer.add(STAGE_MODEL_LOAD, _worker_load_seconds)
+        _worker_load_seconds = None
+    on_segments = on_checkpoint = None
+    if _worker_event_queue is not None:
+        def on_segments(segments):
+            _worker_event_queue.put(("segments", index, segments))
+
+        def on_checkpoint(state):
+            _worker_event_queue.put(("checkpoint", index, state))
+    try:
+        start = time.perf_counter()
+        rss_before = current_rss_bytes()
+        result = transcribe_file(_worker_model, file_path, _worker_language,
+                                 on_segments=on_segments, resume_state=resume_state,
+                                 on_checkpoint=on_checkpoint, timer=timer, **_worker_options)
+        # プロセス間で送る結果は必要な項目だけに絞る
+        return index, file_path, {
+            "text": result["text"],
+            "segments": result.get("segments", []),
+            "language": result.get("language"),
+            "audio_seconds": result.get("audio_seconds"),
+            "skipped_seconds": result.get("skipped_seconds", 0.0),
+            "timings": timer.as_dict(),
+            "elapsed_seconds": time.perf_counter() - start,
+            "peak_rss_bytes": peak_rss_bytes(),
+            "rss_growth_bytes": rss_growth_bytes(rss_before),
+        }, None
+    except Exception as e:
+        return index, file_path, None, str(e)
+
+
+def _drain_events(event_queue, handlers):
+    """ワーカーから届いたセグメント・チェックポイントを親プロセス側のコールバックに渡す"""
+    while True:
+        try:
+            kind, index, payload = event_queue.get_nowait()
+        except queue.Empty:
+            return
+        handler = handlers.get(kind)
+        if handler:
+            handler(index, payload)
+
+
+def iter_parallel_transcriptions(tasks, model_name, language, workers, torch_threads=None,
+                                 transcribe_options=None, on_segments=None, on_checkpoint=None,
+                                 model_loader=None, backend=DEFAULT_BACKEND):
+    """ワーカープールでファイルを並列処理し、完了した順に結果を返すジェネレータ
+
+    tasks: (index, file_path, resume_state) のリスト
+    transcribe_options: chunking.transcribe_file に渡す設定（chunk_seconds, vad など）
+    model_loader: モデルの読み込み関数（model_cache.resolve_loader の形式）
+    backend: 推論バックエンド（backends.BACKENDS のいずれか）
+    on_segments(index, segments) / on_checkpoint(index, state) は処理中の途中経過を受け取り、
+    このジェネレータを回しているスレッドで呼び出される。
+    """
+    if not torch_threads:
+        torch_threads = default_torch_threads(workers)
+    workers = min(workers, len(tasks))
+
+    handlers = {"segments": on_segments, "checkpoint": on_checkpoint}
+    # torchのスレッドプールとforkの相性が悪いためspawnを使用する
+    context = multiprocessing.get_context("spawn")
+    event_queue = context.Queue() if on_segments or on_checkpoint else None
+    with context.Pool(processes=workers, initializer=_init_worker,
+                      initargs=(model_name, language, torch_threads,
+                                transcribe_options or {}, event_queue, model_loader,
+                                backend)) as pool:
+        # chunksize=1 で、空いたワーカーから順に次のファイルを取り出す
+        outcomes = pool.imap_unordered(_transcribe_task, tasks, chunksize=1)
+        for _ in range(len(tasks)):
+            while True:
+                try:
+                    outcome = outcomes.next(timeout=0.2)
+                    break
+                except multiprocessing.TimeoutError:
+                    if event_queue is not None:
+                        _drain_events(event_queue, handlers)
+            if event_queue is not None:
+                _drain_events(event_queue, handlers)
+            yield outcome